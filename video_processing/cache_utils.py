@@ -0,0 +1,107 @@
+import fcntl
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Per-path locks for threads of this process: fcntl locks are held per process,
+# so they only keep other workers out
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def locked(lock_path):
+    """Exclusive lock on lock_path across threads and across workers sharing the filesystem.
+
+    Uses POSIX record locks (lockf), which NFS/EFS honour between hosts.
+    """
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(lock_path, threading.Lock())
+
+    with thread_lock:
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'a') as lock_file:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN)
+
+
+def temporary_path(directory, suffix=''):
+    """A unique name in directory for writing before an atomic rename into place"""
+    return os.path.join(directory, f".tmp-{uuid.uuid4().hex}{suffix}")
+
+
+def atomic_write_bytes(path, data):
+    temp_path = temporary_path(os.path.dirname(path))
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def touch(path):
+    """Mark a cache entry as just used; eviction removes the least recently touched entries first"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def lru_victims(entries, max_bytes, min_idle_seconds=0):
+    """Entries to evict, oldest first, to bring the total size under max_bytes.
+
+    entries are (path, size, last_used) tuples. Entries used within the last
+    min_idle_seconds are never chosen, as a job may still be reading them.
+    """
+    total = sum(size for _, size, _ in entries)
+    now = time.time()
+    victims = []
+    for path, size, last_used in sorted(entries, key=lambda entry: entry[2]):
+        if total <= max_bytes:
+            break
+        if now - last_used < min_idle_seconds:
+            continue
+        victims.append(path)
+        total -= size
+    return victims
+
+
+class CacheStats:
+    """Hit/miss counters for a cache, shared by every job in the process"""
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def record_hit(self, size=0):
+        with self._lock:
+            self.hits += 1
+            self.bytes_served += size
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def record_evictions(self, count):
+        with self._lock:
+            self.evictions += count
+
+    def summary(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            hit_rate = self.hits / lookups if lookups else 0.0
+            return (f"{self.name} cache: {self.hits} hits, {self.misses} misses ({hit_rate:.0%} hit rate), "
+                    f"{self.bytes_served / (1024 * 1024):.1f} MB served, {self.evictions} evictions")
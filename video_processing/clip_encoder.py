@@ -0,0 +1,194 @@
+import functools
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# Audio codecs that can be stream-copied into an MP4 container
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'alac', 'ac3', 'eac3'}
+
+
+@functools.lru_cache(maxsize=64)
+def probe_audio_codec(path):
+    """Codec name of the first audio stream of a file, or None if it has none or cannot be probed"""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=codec_name", "-of", "default=nw=1:nk=1", path],
+            capture_output=True,
+            text=True
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+class PipeEncoder:
+    """Encodes raw RGB frames through a single ffmpeg process fed over stdin.
+
+    Frames are written to the pipe as they are rendered and the audio is read
+    by the same ffmpeg process straight from the source file, so there is no
+    separate audio pass or remux. Source audio already in an MP4-compatible
+    codec is stream-copied; anything else (e.g. Opus from webm downloads) is
+    transcoded with the profile's codec and bitrate.
+
+    Time spent blocked on the pipe is recorded as backpressure: a high share
+    means the encoder, not rendering, is the bottleneck.
+
+    With a sink (such as an S3MultipartSink) the output is written as
+    fragmented MP4 to ffmpeg's stdout and streamed into the sink while
+    encoding, instead of to output_path.
+    """
+
+    def __init__(self, output_path, size, fps, options, audio_source=None, sink=None):
+        # options: keyword arguments from encoding_profiles.encoding_options
+        # audio_source: (path, start, end) of the audio to mux, or None for a silent clip
+        self.output_path = output_path
+        self.sink = sink
+        self.width, self.height = size
+        self.fps = fps
+        self.frames = 0
+        self.blocked_seconds = 0.0
+        self.started = None
+
+        # Frames that are not contiguous uint8 are copied into this buffer before writing
+        self._buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            self._command(options, audio_source),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if sink is not None else subprocess.DEVNULL,
+            stderr=self._stderr,
+            bufsize=0
+        )
+
+        self._sink_error = None
+        self._forwarder = None
+        if sink is not None:
+            self._forwarder = threading.Thread(target=self._forward_output, daemon=True)
+            self._forwarder.start()
+
+    def _forward_output(self):
+        """Copy ffmpeg's stdout into the sink; on a sink failure stop ffmpeg so the writer sees a broken pipe"""
+        try:
+            for chunk in iter(lambda: self._process.stdout.read(1024 * 1024), b''):
+                self.sink.write(chunk)
+        except Exception as e:
+            self._sink_error = e
+            self._process.kill()
+
+    def _command(self, options, audio_source):
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{self.width}x{self.height}",
+            "-r", str(self.fps), "-i", "-"
+        ]
+        if audio_source:
+            path, start, end = audio_source
+            command += ["-ss", str(start), "-t", str(end - start), "-i", path]
+
+        command += ["-map", "0:v"]
+        if audio_source:
+            command += ["-map", "1:a:0?"]
+
+        command += ["-c:v", options['codec'], "-preset", options['preset'], "-threads", str(options['threads'])]
+        if options.get('bitrate'):
+            command += ["-b:v", options['bitrate']]
+        command += list(options.get('ffmpeg_params', []))
+
+        if audio_source:
+            if probe_audio_codec(audio_source[0]) in MP4_AUDIO_CODECS:
+                command += ["-c:a", "copy"]
+            else:
+                command += ["-c:a", options['audio_codec'], "-b:a", options['audio_bitrate']]
+
+        if self.sink is not None:
+            # A fragmented MP4 can be written front to back to a pipe; delay_moov holds the
+            # moov until the first fragment so it gets the edit list for the B-frame delay,
+            # without which the video starts that far after the audio
+            return command + ["-movflags", "frag_keyframe+empty_moov+delay_moov+default_base_moof",
+                              "-f", "mp4", "pipe:1"]
+        return command + [self.output_path]
+
+    def write_frame(self, frame):
+        if self.started is None:
+            self.started = time.time()
+
+        if frame.dtype != np.uint8 or not frame.flags['C_CONTIGUOUS'] or frame.shape != self._buffer.shape:
+            np.copyto(self._buffer, frame[:self.height, :self.width, :3], casting='unsafe')
+            frame = self._buffer
+
+        tick = time.time()
+        try:
+            self._process.stdin.write(memoryview(frame).cast('B'))
+        except BrokenPipeError:
+            if self._sink_error is not None:
+                raise Exception(f"Output sink failed while encoding {self.output_path}: {self._sink_error}")
+            raise Exception(f"ffmpeg exited while encoding {self.output_path}: {self._error_output()}")
+        self.blocked_seconds += time.time() - tick
+        self.frames += 1
+
+    def close(self):
+        if self._process.stdin and not self._process.stdin.closed:
+            self._process.stdin.close()
+        returncode = self._process.wait()
+        if self._forwarder is not None:
+            self._forwarder.join()
+        error_output = self._error_output()
+        self._stderr.close()
+
+        if self._sink_error is not None or returncode != 0:
+            if self.sink is not None:
+                self.sink.abort()
+            if self._sink_error is not None:
+                raise Exception(f"Output sink failed while encoding {self.output_path}: {self._sink_error}")
+            raise Exception(f"Failed to encode {self.output_path}: {error_output}")
+
+        if self.sink is not None:
+            self.sink.close()
+
+    def abort(self):
+        if self._process.stdin and not self._process.stdin.closed:
+            self._process.stdin.close()
+        self._process.kill()
+        self._process.wait()
+        if self._forwarder is not None:
+            self._forwarder.join()
+        self._stderr.close()
+        if self.sink is not None:
+            self.sink.abort()
+
+    def stats(self):
+        elapsed = time.time() - self.started if self.started else 0.0
+        return {
+            'frames': self.frames,
+            'seconds': elapsed,
+            'fps': self.frames / elapsed if elapsed else 0.0,
+            'blocked_seconds': self.blocked_seconds,
+            'backpressure': self.blocked_seconds / elapsed if elapsed else 0.0,
+        }
+
+    def _error_output(self):
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors='replace')[-500:]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def encode_clip(clip, output_path, options, audio_source=None, sink=None):
+    """Render every frame of a moviepy clip into output_path (or the sink) through a PipeEncoder"""
+    with PipeEncoder(output_path, clip.size, clip.fps, options, audio_source, sink) as encoder:
+        for frame in clip.iter_frames(dtype='uint8'):
+            encoder.write_frame(frame)
+    return encoder.stats()
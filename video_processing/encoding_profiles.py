@@ -0,0 +1,85 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# x264/AAC settings used when writing final clips. 'threads' of None uses
+# ENCODE_THREADS, which defaults to an even share of the CPUs between the
+# worker's concurrent jobs.
+ENCODING_PROFILES = {
+    'preview': {
+        'preset': 'ultrafast',
+        'crf': 28,
+        'threads': None,
+        'audio_bitrate': '96k',
+        'pix_fmt': 'yuv420p',
+    },
+    'standard': {
+        'preset': 'veryfast',
+        'crf': 23,
+        'threads': None,
+        'audio_bitrate': '128k',
+        'pix_fmt': 'yuv420p',
+    },
+    'premium': {
+        'preset': 'medium',
+        'crf': 18,
+        'threads': None,
+        'audio_bitrate': '192k',
+        'pix_fmt': 'yuv420p',
+    },
+}
+
+# Profile used for each requested download quality
+QUALITY_PROFILES = {
+    '360': 'preview',
+    '480': 'preview',
+    '720': 'standard',
+    '1080': 'premium',
+}
+
+DEFAULT_ENCODING_PROFILE = os.environ.get('DEFAULT_ENCODING_PROFILE', 'standard')
+if DEFAULT_ENCODING_PROFILE not in ENCODING_PROFILES:
+    logger.warning(f"Unknown DEFAULT_ENCODING_PROFILE {DEFAULT_ENCODING_PROFILE!r}, using 'standard'")
+    DEFAULT_ENCODING_PROFILE = 'standard'
+
+# Concurrent jobs per worker that share the CPUs while encoding
+ENCODE_JOB_SLOTS = int(os.environ.get('ENCODE_JOB_SLOTS', 4))
+ENCODE_THREADS = int(os.environ.get('ENCODE_THREADS', max(1, (os.cpu_count() or 1) // ENCODE_JOB_SLOTS)))
+
+
+def resolve_encoding_profile(name=None, video_quality=None):
+    """Name of the profile for a job: an explicit name wins, then the video quality, then the default.
+
+    An unknown name is logged and ignored rather than failing the job.
+    """
+    if name:
+        if name in ENCODING_PROFILES:
+            return name
+        logger.warning(f"Unknown encoding profile {name!r}, using the quality or default profile")
+    if video_quality:
+        quality = str(video_quality).replace('p', '')
+        if quality in QUALITY_PROFILES:
+            return QUALITY_PROFILES[quality]
+    return DEFAULT_ENCODING_PROFILE
+
+
+def encoding_options(name):
+    """Keyword arguments for moviepy's write_videofile for a profile"""
+    profile = ENCODING_PROFILES[name]
+    ffmpeg_params = ['-pix_fmt', profile['pix_fmt'], '-movflags', '+faststart']
+    if profile.get('bitrate'):
+        bitrate = profile['bitrate']
+    else:
+        bitrate = None
+        ffmpeg_params = ['-crf', str(profile['crf'])] + ffmpeg_params
+
+    return {
+        'codec': 'libx264',
+        'audio_codec': 'aac',
+        'preset': profile['preset'],
+        'bitrate': bitrate,
+        'threads': profile['threads'] or ENCODE_THREADS,
+        'audio_bitrate': profile['audio_bitrate'],
+        'ffmpeg_params': ffmpeg_params,
+    }
@@ -0,0 +1,104 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+
+class FaceDetector:
+    """A MediaPipe face detector with its own detection proxy buffer.
+
+    Instances are not thread-safe; each one is used by a single job at a time.
+    """
+
+    def __init__(self, proxy_width=320, model_selection=1, min_detection_confidence=0.5):
+        # Frames wider than this are downscaled before detection (0 detects at full resolution)
+        self.proxy_width = proxy_width
+        self.face_detection = mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_detection_confidence
+        )
+        self._proxy = None
+
+    def detect(self, frame):
+        rgb_frame = self._detection_input(frame)
+        face_results = self.face_detection.process(rgb_frame)
+
+        face_bboxes = []
+        if face_results.detections:
+            for detection in face_results.detections:
+                # Boxes are relative, so they map straight back to the full-resolution frame
+                bbox = detection.location_data.relative_bounding_box
+                x, y, w, h = bbox.xmin, bbox.ymin, bbox.width, bbox.height
+                x, y, w, h = int(x * frame.shape[1]), int(y * frame.shape[0]), int(w * frame.shape[1]), int(h * frame.shape[0])
+                face_bboxes.append((x, y, w, h))
+
+        return face_bboxes
+
+    def _detection_input(self, frame):
+        """Downscale the frame to the detection proxy width and convert it for MediaPipe.
+
+        The proxy is written into one reused buffer, so each frame costs a single
+        resize and an in-place colour conversion on the small image.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        if not self.proxy_width or frame_width <= self.proxy_width:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        proxy_height = max(1, round(frame_height * self.proxy_width / frame_width))
+        if self._proxy is None or self._proxy.shape[:2] != (proxy_height, self.proxy_width):
+            self._proxy = np.empty((proxy_height, self.proxy_width, 3), dtype=np.uint8)
+
+        cv2.resize(frame, (self.proxy_width, proxy_height), dst=self._proxy, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._proxy, cv2.COLOR_BGR2RGB, dst=self._proxy)
+        return self._proxy
+
+    def close(self):
+        self.face_detection.close()
+
+
+class FaceDetectorPool:
+    """Hands out FaceDetector instances to concurrent jobs.
+
+    Up to `size` detectors are created lazily; a job checks one out for the
+    whole clip, so jobs run inference in parallel instead of queueing on a
+    single shared detector. When all detectors are busy, checkout blocks.
+    """
+
+    def __init__(self, size=4, proxy_width=320):
+        self.size = max(1, int(size))
+        self.proxy_width = proxy_width
+        self._available = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self):
+        detector = self._acquire()
+        try:
+            yield detector
+        finally:
+            self._available.put(detector)
+
+    def _acquire(self):
+        try:
+            return self._available.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if not can_create:
+            return self._available.get()
+
+        try:
+            return FaceDetector(self.proxy_width)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
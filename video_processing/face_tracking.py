@@ -0,0 +1,275 @@
+import cv2
+import numpy as np
+
+# Frame modes stored in FaceTrack.modes
+MODE_FULL = 0
+MODE_FACE = 1
+
+# Low-resolution copy of each frame used for motion scoring and cut detection
+ANALYSIS_SIZE = (160, 90)
+# Size of the grayscale thumbnails used to score motion between frames
+MOTION_THUMBNAIL_SIZE = (64, 36)
+
+# Frames sampled for faces at the start of every shot, and their spacing
+SHOT_SAMPLES = 3
+SHOT_SAMPLE_SPACING = 5
+
+# Strided detection is expected to stay within this fraction of the frame width
+# of per-frame detection (~22px at 1080p). That is well inside the 30% dead zone
+# of is_minor_movement, so the crop chosen by update_face_box does not change.
+INTERPOLATION_TOLERANCE = 0.02
+
+
+def motion_thumbnail(frame):
+    small = cv2.resize(frame, MOTION_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+
+def motion_score(thumbnail1, thumbnail2):
+    """Mean absolute pixel difference (0-255) between two motion thumbnails"""
+    return cv2.norm(thumbnail1, thumbnail2, cv2.NORM_L1) / thumbnail1.size
+
+
+class ShotDetector:
+    """Flags hard cuts by comparing colour histograms of consecutive low-resolution frames"""
+
+    def __init__(self, threshold=0.4):
+        # Bhattacharyya distance (0-1) above which two frames belong to different shots
+        self.threshold = threshold
+        self.previous_histogram = None
+
+    def is_cut(self, small_frame):
+        hsv = cv2.cvtColor(small_frame, cv2.COLOR_RGB2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+        cv2.normalize(histogram, histogram)
+
+        previous_histogram, self.previous_histogram = self.previous_histogram, histogram
+        if previous_histogram is None:
+            return False
+        return cv2.compareHist(previous_histogram, histogram, cv2.HISTCMP_BHATTACHARYYA) > self.threshold
+
+
+class DetectionScheduler:
+    """Decides which frames get a fresh face detection.
+
+    Detection runs every `stride` frames, and earlier whenever the frame has
+    moved more than `motion_threshold` away from the last detected frame.
+    A stride of 1 detects on every frame.
+
+    With `shot_cut_threshold` set, cuts are detected on every frame and the
+    first SHOT_SAMPLES frames of each shot are always detected; `at_cut` tells
+    the caller whether the last frame passed in started a new shot.
+    """
+
+    def __init__(self, stride=1, motion_threshold=None, shot_cut_threshold=None):
+        self.stride = max(1, int(stride))
+        self.motion_threshold = motion_threshold
+        self.shot_detector = ShotDetector(shot_cut_threshold) if shot_cut_threshold else None
+        self.last_index = None
+        self.last_thumbnail = None
+        self.pending_samples = set()
+        self.at_cut = False
+
+    def should_detect(self, index, frame):
+        self.at_cut = False
+        if self.stride == 1 and self.shot_detector is None:
+            return True
+
+        small = None
+        if self.motion_threshold or self.shot_detector is not None:
+            small = cv2.resize(frame, ANALYSIS_SIZE, interpolation=cv2.INTER_AREA)
+
+        if self.shot_detector is not None:
+            self.at_cut = self.shot_detector.is_cut(small)
+            if self.at_cut or self.last_index is None:
+                self.pending_samples = {index + n * SHOT_SAMPLE_SPACING for n in range(SHOT_SAMPLES)}
+
+        thumbnail = motion_thumbnail(small) if self.motion_threshold else None
+        due = (self.last_index is None
+               or index - self.last_index >= self.stride
+               or index in self.pending_samples)
+        if not due and thumbnail is not None:
+            due = motion_score(thumbnail, self.last_thumbnail) > self.motion_threshold
+
+        if due:
+            self.pending_samples.discard(index)
+            self.last_index = index
+            self.last_thumbnail = thumbnail
+        return due
+
+
+class FaceTrack:
+    """Per-frame face detections and framing modes for a single clip.
+
+    Built from one decode + detect pass over the clip; the mode pass, the
+    jitter filter and the render pass all read from these arrays instead of
+    decoding and detecting again.
+    """
+
+    def __init__(self, frame_count, fps, frame_height, frame_width):
+        self.frame_count = frame_count
+        self.fps = fps
+        self.frame_height = frame_height
+        self.frame_width = frame_width
+
+        # First detected face of each frame as (x, y, w, h), valid where counts > 0
+        self.boxes = np.zeros((frame_count, 4), dtype=np.int32)
+        # Number of faces detected in each frame
+        self.counts = np.zeros(frame_count, dtype=np.int16)
+        # Frames that start a new shot (a cut was detected just before them)
+        self.shot_starts = np.zeros(frame_count, dtype=bool)
+        # Frames where the detector actually ran; the rest are filled by fill_gaps
+        self.detected = np.zeros(frame_count, dtype=bool)
+        # MODE_FULL / MODE_FACE per frame, filled by assign_modes and filter_jitter
+        self.modes = np.full(frame_count, MODE_FULL, dtype=np.uint8)
+        # Planned face crop (x, y, w, h) per face-mode frame, valid where has_crop is set
+        self.crops = np.zeros((frame_count, 4), dtype=np.int32)
+        self.has_crop = np.zeros(frame_count, dtype=bool)
+
+    def record(self, index, faces):
+        self.detected[index] = True
+        self.counts[index] = len(faces)
+        if faces:
+            self.boxes[index] = faces[0]
+
+    def fill_gaps(self):
+        """Fill frames between detections.
+
+        Boxes are linearly interpolated between two detections of a single face
+        in the same shot, otherwise the previous detection is held.
+        """
+        keyframes = np.flatnonzero(self.detected).tolist()
+        if not keyframes:
+            return
+
+        for a, b in zip(keyframes[:-1], keyframes[1:]):
+            if b - a < 2:
+                continue
+            self.counts[a + 1:b] = self.counts[a]
+            same_shot = not self.shot_starts[a + 1:b + 1].any()
+            if same_shot and self.counts[a] == 1 and self.counts[b] == 1:
+                weights = (np.arange(1, b - a) / (b - a))[:, None]
+                delta = (self.boxes[b] - self.boxes[a]) * weights
+                self.boxes[a + 1:b] = np.rint(self.boxes[a] + delta)
+            else:
+                self.boxes[a + 1:b] = self.boxes[a]
+
+        last = keyframes[-1]
+        self.counts[last + 1:] = self.counts[last]
+        self.boxes[last + 1:] = self.boxes[last]
+
+    def stabilize_shots(self, tolerance):
+        """Fix the face box for the whole of each shot whose detections agree.
+
+        A shot where every detection found exactly one face, with boxes no more
+        than `tolerance` pixels apart, gets the median box on every frame;
+        other shots keep their tracked boxes.
+        """
+        shot_bounds = np.concatenate(([0], np.flatnonzero(self.shot_starts), [self.frame_count]))
+        for start, end in zip(shot_bounds[:-1].tolist(), shot_bounds[1:].tolist()):
+            if start >= end:
+                continue
+            detected = np.flatnonzero(self.detected[start:end]) + start
+            if len(detected) == 0 or (self.counts[detected] != 1).any():
+                continue
+            boxes = self.boxes[detected]
+            if (boxes.max(axis=0) - boxes.min(axis=0)).max() > tolerance:
+                continue
+            self.counts[start:end] = 1
+            self.boxes[start:end] = np.median(boxes, axis=0).astype(np.int32)
+
+    def max_box_deviation(self, other):
+        """Largest box coordinate difference in pixels against another track of the same clip"""
+        both = (self.counts > 0) & (other.counts > 0)
+        if not both.any():
+            return 0
+        return int(np.abs(self.boxes[both] - other.boxes[both]).max())
+
+    def index_at(self, t):
+        """Frame index for time t, clamped to the track"""
+        # Round rather than truncate: t = i / fps does not always survive the float round trip
+        index = int(round(t * self.fps))
+        return max(0, min(index, self.frame_count - 1))
+
+    def faces(self, index):
+        # Only the first face is ever used for framing
+        if self.counts[index] == 0:
+            return []
+        return [tuple(int(v) for v in self.boxes[index])]
+
+    def mode(self, index):
+        return 'face' if self.modes[index] == MODE_FACE else 'full'
+
+    def crop(self, index):
+        if not self.has_crop[index]:
+            return None
+        return tuple(int(v) for v in self.crops[index])
+
+    def merge_detections(self, start, detected, counts, boxes, shot_starts):
+        """Copy raw detections for frames start..start+len(detected) from a shard's track"""
+        end = start + len(detected)
+        self.detected[start:end] = detected
+        self.counts[start:end] = counts
+        self.boxes[start:end] = boxes
+        self.shot_starts[start:end] = shot_starts
+
+    def assign_modes(self, face_detection_threshold, no_detection_threshold):
+        """Decide face/full mode per frame from the detection counts"""
+        face_detection_counter = 0
+        no_detection_counter = 0
+        is_initial_phase = True
+        previous_mode = MODE_FULL
+        shot_starts = self.shot_starts.tolist()
+
+        for i, count in enumerate(self.counts.tolist()):
+            if shot_starts[i]:
+                # A cut: decide the new shot's mode immediately instead of waiting out the counters
+                is_initial_phase = False
+                face_detection_counter = face_detection_threshold if count == 1 else 0
+                no_detection_counter = 0 if count == 1 else no_detection_threshold
+                mode = MODE_FACE if count == 1 else MODE_FULL
+            elif is_initial_phase:
+                if count == 1:
+                    face_detection_counter += 1
+                    if face_detection_counter >= face_detection_threshold:
+                        is_initial_phase = False
+                    mode = MODE_FACE
+                else:
+                    no_detection_counter += 1
+                    if no_detection_counter >= no_detection_threshold:
+                        is_initial_phase = False
+                    mode = MODE_FULL
+            else:
+                if count == 1:
+                    face_detection_counter += 1
+                    no_detection_counter = 0
+                else:
+                    face_detection_counter = 0
+                    no_detection_counter += 1
+
+                if face_detection_counter >= face_detection_threshold:
+                    mode = MODE_FACE
+                elif no_detection_counter >= no_detection_threshold:
+                    mode = MODE_FULL
+                else:
+                    mode = previous_mode
+
+            self.modes[i] = mode
+            previous_mode = mode
+
+    def filter_jitter(self, jitter_threshold):
+        """Replace mode runs shorter than jitter_threshold frames with the preceding mode"""
+        if self.frame_count == 0:
+            return
+
+        run_starts = np.concatenate(([0], np.flatnonzero(np.diff(self.modes)) + 1))
+        run_ends = np.append(run_starts[1:], self.frame_count)
+
+        filtered = np.empty_like(self.modes)
+        for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+            if end - start >= jitter_threshold or start == 0:
+                filtered[start:end] = self.modes[start]
+            else:
+                filtered[start:end] = filtered[start - 1]
+
+        self.modes = filtered
@@ -0,0 +1,96 @@
+import os
+import subprocess
+
+
+class FfmpegJobPlan:
+    """Every cut and audio file a job needs from one source, run as a single ffmpeg invocation.
+
+    Each time range becomes its own input with an input-side seek, so ffmpeg
+    reads only that part of the source, and all of the range's outputs are
+    written from it. Outputs that already exist are skipped, and outputs are
+    written under a temporary name and renamed once ffmpeg succeeds, so a
+    failed run never leaves a file that a later run would skip.
+    """
+
+    def __init__(self, source_path):
+        self.source_path = source_path
+        # (start, end, video_path, audio_path, video_args); start/end of None mean the whole file
+        self.ranges = []
+
+    def add(self, start=None, end=None, video_path=None, audio_path=None, video_args=None):
+        """Plan a video cut and/or the ASR audio (see ASR_AUDIO_ARGS) of start..end.
+
+        The video is stream-copied unless video_args gives other codec options.
+        """
+        self.ranges.append((start, end, video_path, audio_path, video_args or ["-c", "copy"]))
+        return self
+
+    def command(self):
+        """The ffmpeg command for every missing output, and (temporary, final) path pairs, or (None, [])"""
+        inputs, outputs, renames = [], [], []
+
+        for start, end, video_path, audio_path, video_args in self.ranges:
+            pending = [path for path in (video_path, audio_path) if path and not os.path.exists(path)]
+            if not pending:
+                continue
+
+            index = len(inputs)
+            seek = []
+            if start is not None:
+                seek += ["-ss", str(start)]
+            if end is not None:
+                seek += ["-t", str(end - (start or 0))]
+            inputs.append(seek + ["-i", self.source_path])
+
+            if video_path in pending:
+                partial_path = self._partial_path(video_path)
+                outputs += ["-map", f"{index}:v?", "-map", f"{index}:a?", *video_args, partial_path]
+                renames.append((partial_path, video_path))
+            if audio_path in pending:
+                partial_path = self._partial_path(audio_path)
+                outputs += ["-map", f"{index}:a", *ASR_AUDIO_ARGS, partial_path]
+                renames.append((partial_path, audio_path))
+
+        if not inputs:
+            return None, []
+        command = ["ffmpeg", "-y", "-loglevel", "error"]
+        for input_args in inputs:
+            command += input_args
+        return command + outputs, renames
+
+    def run(self):
+        command, renames = self.command()
+        if command is None:
+            print("All ffmpeg outputs already exist, skipping")
+            return
+
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            for partial_path, _ in renames:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+            raise Exception(f"ffmpeg failed for {self.source_path}: {result.stderr[-500:]}")
+
+        for partial_path, path in renames:
+            os.replace(partial_path, path)
+
+    @staticmethod
+    def _partial_path(path):
+        # Keep the extension last so ffmpeg still picks the container from it
+        root, extension = os.path.splitext(path)
+        return f"{root}.partial{extension}"
+
+
+# Audio files are only used for transcription: mono 16 kHz speech-tuned Opus in Ogg
+# is a small fraction of a full-quality mp3's size and uploads that much faster.
+# bitexact drops the random Ogg stream serial number and encoder tags, so the same
+# audio always gives the same bytes and TranscriptCache keys match between runs.
+ASR_AUDIO_ARGS = ["-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k", "-application", "voip",
+                  "-fflags", "+bitexact", "-flags:a", "+bitexact"]
+ASR_AUDIO_EXTENSION = ".ogg"
+
+# video_args for pre-cut segment files: near-lossless, fast to write and a keyframe
+# every second. Audio is stored as PCM, since a stream copy would start on the
+# packet at the source keyframe instead of the exact cut point.
+PRECUT_VIDEO_ARGS = ["-c:v", "libx264", "-preset", "ultrafast", "-crf", "12",
+                     "-force_key_frames", "expr:gte(t,n_forced*1)", "-c:a", "pcm_s16le"]
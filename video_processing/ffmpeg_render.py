@@ -0,0 +1,126 @@
+import os
+import subprocess
+
+import cv2
+import numpy as np
+
+from face_tracking import MODE_FACE
+from frame_renderer import WATERMARK_PATH, WATERMARK_HEIGHT_RATIO, WATERMARK_MARGIN, GRADIENT_SAMPLE_ROWS
+
+# The rendered video is encoded once more when captions are composited, so it
+# is written near-lossless with a fast preset
+TIMELINE_PRESET = 'veryfast'
+TIMELINE_FFMPEG_PARAMS = ['-crf', '12', '-pix_fmt', 'yuv420p']
+
+# Every run adds a branch to the filter graph; clips whose crop changes more
+# often than this are left to the frame-by-frame renderer
+MAX_TIMELINE_RUNS = 200
+
+
+def build_crop_timeline(track, sample_frame, target_width=1080, target_height=1920):
+    """Collapse a planned FaceTrack into runs of frames that share one framing.
+
+    Each run is a dict with the frame range ('start', 'end'), the face 'crop'
+    (x, y, w, h), or None for a letterboxed run, and for letterboxed runs the
+    'band_colors' (top, bottom) sampled the way FrameRenderer picks them: from
+    the run's first frame at the start of the clip, otherwise from the edges of
+    the face crop that precedes it. sample_frame(index) returns a source frame.
+    """
+    timeline = []
+    for i in range(track.frame_count):
+        crop = track.crop(i) if track.modes[i] == MODE_FACE else None
+        if timeline and timeline[-1]['crop'] == crop:
+            timeline[-1]['end'] = i + 1
+        else:
+            timeline.append({'start': i, 'end': i + 1, 'crop': crop})
+
+    for previous, run in zip([None] + timeline[:-1], timeline):
+        if run['crop'] is not None:
+            continue
+        if previous is None:
+            frame = sample_frame(run['start'])
+            new_height = int(target_width / (frame.shape[1] / frame.shape[0]))
+            edges = cv2.resize(frame, (target_width, new_height))
+        else:
+            x, y, w, h = previous['crop']
+            frame = sample_frame(run['start'] - 1)
+            edges = cv2.resize(frame[y:y+h, x:x+w], (target_width, target_height))
+        run['band_colors'] = sample_band_colors(edges)
+    return timeline
+
+
+def sample_band_colors(resized):
+    """Top and bottom colours of an output-sized frame, as in FrameRenderer"""
+    top = np.median(resized[:GRADIENT_SAMPLE_ROWS, :], axis=(0, 1)).astype(np.uint8)
+    bottom = np.median(resized[-GRADIENT_SAMPLE_ROWS:, :], axis=(0, 1)).astype(np.uint8)
+    return tuple(top.tolist()), tuple(bottom.tolist())
+
+
+def _hex_color(rgb):
+    return '0x{:02X}{:02X}{:02X}'.format(*rgb)
+
+
+def timeline_filter_graph(timeline, fps, source_size, target_width=1080, target_height=1920, watermark_height=None):
+    """filter_complex script that renders the timeline from input 0 (and the watermark from input 1)"""
+    source_width, source_height = source_size
+    new_height = int(target_width / (source_width / source_height))
+    y_offset = (target_height - new_height) // 2
+
+    # Work in RGB so odd crop offsets and band heights are not rounded to the chroma grid
+    branches = ''.join(f'[s{n}]' for n in range(len(timeline)))
+    lines = [f'[0:v]fps={fps},format=rgb24,split={len(timeline)}{branches}']
+
+    for n, run in enumerate(timeline):
+        chain = [f"trim=start_frame={run['start']}:end_frame={run['end']}", 'setpts=PTS-STARTPTS']
+        if run['crop'] is not None:
+            x, y, w, h = run['crop']
+            chain += [f'crop={w}:{h}:{x}:{y}', f'scale={target_width}:{target_height}']
+        else:
+            top, bottom = run['band_colors']
+            chain += [f'scale={target_width}:{new_height}',
+                      f'pad={target_width}:{target_height}:0:{y_offset}:black']
+            # drawbox treats a zero height as the full frame, so empty bands are skipped
+            if y_offset > 0:
+                chain += [f'drawbox=x=0:y=0:w={target_width}:h={y_offset}:color={_hex_color(top)}:t=fill',
+                          f'drawbox=x=0:y={target_height - y_offset}:w={target_width}:h={y_offset}:color={_hex_color(bottom)}:t=fill']
+        chain.append('setsar=1')
+        lines.append(f"[s{n}]{','.join(chain)}[v{n}]")
+
+    outputs = ''.join(f'[v{n}]' for n in range(len(timeline)))
+    lines.append(f'{outputs}concat=n={len(timeline)}:v=1:a=0[framed]')
+
+    if watermark_height:
+        lines.append(f'[1:v]scale=-1:{watermark_height}[wm]')
+        lines.append(f'[framed][wm]overlay=W-w-{WATERMARK_MARGIN}:H-h-{WATERMARK_MARGIN},format=yuv420p[out]')
+    else:
+        lines.append('[framed]format=yuv420p[out]')
+
+    return ';\n'.join(lines)
+
+
+def render_timeline(video_path, clip_start, fps, frame_count, source_size, timeline, output_path, add_watermark=False):
+    """Render a crop timeline straight from the source file with a single ffmpeg run.
+
+    Decoding, cropping, scaling, padding and the watermark all happen in
+    ffmpeg's filter graph; the output is video-only.
+    """
+    watermark_height = int(source_size[1] * WATERMARK_HEIGHT_RATIO) if add_watermark else None
+    graph_path = output_path + '.filter'
+    with open(graph_path, 'w') as f:
+        f.write(timeline_filter_graph(timeline, fps, source_size, watermark_height=watermark_height))
+
+    command = ["ffmpeg", "-y", "-ss", str(clip_start), "-t", str(frame_count / fps), "-i", video_path]
+    if watermark_height:
+        command += ["-i", WATERMARK_PATH]
+    command += [
+        "-filter_complex_script", graph_path,
+        "-map", "[out]", "-an",
+        "-c:v", "libx264", "-preset", TIMELINE_PRESET, *TIMELINE_FFMPEG_PARAMS,
+        output_path
+    ]
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    os.remove(graph_path)
+    if result.returncode != 0:
+        raise Exception(f"Failed to render crop timeline: {result.stderr[-500:]}")
+    return output_path
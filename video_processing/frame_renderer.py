@@ -0,0 +1,185 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from face_tracking import MODE_FACE
+
+# Watermark asset and placement (bottom-right corner)
+WATERMARK_PATH = os.environ.get('WATERMARK_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'watermark.png'))
+WATERMARK_HEIGHT_RATIO = float(os.environ.get('WATERMARK_HEIGHT_RATIO', 0.05))
+WATERMARK_MARGIN = int(os.environ.get('WATERMARK_MARGIN', 10))
+
+# Prepared watermarks by (path, height), shared by every clip and job in the process
+_watermark_cache = {}
+_watermark_cache_lock = threading.Lock()
+
+
+class Watermark:
+    """A watermark premultiplied for fixed-point blending onto uint8 frames.
+
+    Blending is out = (frame * (255 - alpha) + rgb * alpha) / 255, done in
+    uint16 with exact rounding and written back into the frame in place.
+    """
+
+    def __init__(self, image, margin=WATERMARK_MARGIN):
+        alpha = image[:, :, 3:4].astype(np.uint16)
+        self.premultiplied = image[:, :, :3].astype(np.uint16) * alpha
+        self.inverse_alpha = 255 - alpha
+        self.height, self.width = image.shape[:2]
+        self.margin = margin
+
+    def rows(self, frame_height):
+        """Frame rows covered by the watermark"""
+        end = frame_height - self.margin
+        return end - self.height, end
+
+    def apply(self, frame):
+        frame_height, frame_width = frame.shape[:2]
+        y, _ = self.rows(frame_height)
+        x = frame_width - self.width - self.margin
+        roi = frame[y:y+self.height, x:x+self.width]
+
+        # Max value is 255 * 255 + 128, so the whole blend fits in uint16
+        blended = roi * self.inverse_alpha
+        blended += self.premultiplied
+        blended += 128
+        blended += blended >> 8
+        blended >>= 8
+        roi[:] = blended
+        return frame
+
+
+def get_watermark(reference_height):
+    """Watermark sized to WATERMARK_HEIGHT_RATIO of reference_height, loaded once per size"""
+    watermark_height = int(reference_height * WATERMARK_HEIGHT_RATIO)
+    key = (WATERMARK_PATH, watermark_height)
+
+    with _watermark_cache_lock:
+        watermark = _watermark_cache.get(key)
+        if watermark is None:
+            image = cv2.imread(WATERMARK_PATH, cv2.IMREAD_UNCHANGED)
+            if image is None or image.ndim != 3 or image.shape[2] != 4:
+                raise ValueError(f"Watermark must be an RGBA image: {WATERMARK_PATH}")
+            aspect_ratio = image.shape[1] / image.shape[0]
+            watermark_width = int(watermark_height * aspect_ratio)
+            image = cv2.resize(image, (watermark_width, watermark_height))
+            watermark = Watermark(image)
+            _watermark_cache[key] = watermark
+
+    return watermark
+
+
+# Rows sampled at the top and bottom edge of a frame for the band colours
+GRADIENT_SAMPLE_ROWS = 10
+
+
+class FrameRenderer:
+    """Turns source frames into portrait output frames from a planned mode and crop.
+
+    Holds the per-clip render state (the gradient colours carried from one
+    output frame to the next), so one instance renders one contiguous run of
+    frames. It has no dependency on VideoProcessor and can run in a worker process.
+
+    Output frames are written into two preallocated canvases used in turn, so
+    the frame returned by render is only valid until the next-but-one call.
+    """
+
+    def __init__(self, target_width=1080, target_height=1920, watermark=None):
+        self.target_width = target_width
+        self.target_height = target_height
+        # Watermark from get_watermark, or None
+        self.watermark = watermark
+        # Band colours of the last letterboxed frame
+        self.gradient_colors = None
+
+        self._canvases = [np.zeros((target_height, target_width, 3), dtype=np.uint8) for _ in range(2)]
+        # Band layout and colours currently painted on each canvas
+        self._painted_bands = [None, None]
+        # Rows the watermark was blended into on each canvas
+        self._watermark_rows = [None, None]
+        self._current = 0
+        # Band height of the previous output frame: None before the first frame, 0 for face crops
+        self._previous_band_height = None
+
+    def render(self, frame, mode, crop_box):
+        previous_frame = self._canvases[self._current]
+        self._current ^= 1
+        canvas = self._canvases[self._current]
+
+        if mode == MODE_FACE and crop_box is not None:
+            x, y, w, h = crop_box
+            face_crop = frame[y:y+h, x:x+w]
+            cv2.resize(face_crop, (self.target_width, self.target_height), dst=canvas)
+            self._painted_bands[self._current] = None
+            self._watermark_rows[self._current] = None
+            band_height = 0
+        elif mode == MODE_FACE:
+            # No face has been locked yet, fall back to the letterboxed frame
+            band_height = self.create_landscape_frame(frame, canvas, None)
+        else:  # 'full' mode
+            band_height = self.create_landscape_frame(frame, canvas, self._next_gradient_colors(previous_frame))
+
+        self._previous_band_height = band_height
+
+        if self.watermark is not None:
+            self.watermark.apply(canvas)
+            self._watermark_rows[self._current] = self.watermark.rows(self.target_height)
+
+        return canvas
+
+    def _next_gradient_colors(self, previous_frame):
+        """Band colours for a letterboxed frame: the edge colours of the previous output frame.
+
+        A letterboxed frame's edges are its own bands, so the colours only need
+        sampling again after a face crop; the first frame samples itself.
+        """
+        if self._previous_band_height is None:
+            return None
+        if self._previous_band_height >= GRADIENT_SAMPLE_ROWS:
+            return self.gradient_colors
+        return self.update_gradient_colors(previous_frame)
+
+    def create_landscape_frame(self, frame, canvas, gradient_colors):
+        """Letterbox the frame into canvas between solid colour bands; returns the band height"""
+        target_width, target_height = self.target_width, self.target_height
+        aspect_ratio = frame.shape[1] / frame.shape[0]
+        new_height = int(target_width / aspect_ratio)
+        y_offset = (target_height - new_height) // 2
+
+        resized_frame = canvas[y_offset:y_offset+new_height]
+        cv2.resize(frame, (target_width, new_height), dst=resized_frame)
+
+        if gradient_colors is None:
+            gradient_colors = self.update_gradient_colors(resized_frame)
+        self.gradient_colors = gradient_colors
+
+        bands = (
+            (0, y_offset, gradient_colors['top']),
+            (y_offset + new_height, target_height - y_offset, 0),  # odd leftover row stays black
+            (target_height - y_offset, target_height, gradient_colors['bottom']),
+        )
+        band_key = (y_offset, new_height, tuple(gradient_colors['top'].tolist()), tuple(gradient_colors['bottom'].tolist()))
+
+        # Bands are only repainted when the colours change; otherwise just the
+        # rows the watermark was blended into last time this canvas was used
+        if self._painted_bands[self._current] != band_key:
+            rows = (0, target_height)
+        else:
+            rows = self._watermark_rows[self._current]
+
+        if rows is not None:
+            for start, end, color in bands:
+                start, end = max(start, rows[0]), min(end, rows[1])
+                if start < end:
+                    canvas[start:end] = color
+
+        self._painted_bands[self._current] = band_key
+        return y_offset
+
+    def update_gradient_colors(self, frame):
+        return {
+            'top': np.median(frame[:GRADIENT_SAMPLE_ROWS, :], axis=(0, 1)).astype(np.uint8),
+            'bottom': np.median(frame[-GRADIENT_SAMPLE_ROWS:, :], axis=(0, 1)).astype(np.uint8)
+        }
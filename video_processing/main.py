@@ -1,26 +1,40 @@
 import moviepy.editor as mp_edit
-import mediapipe as mp
 import os
 import glob
 import subprocess
 import json
-import httpx
 from anthropic import Anthropic
 import cv2
 import boto3
 import numpy as np
 from deepgram import (
     DeepgramClient,
-    PrerecordedOptions,
-    FileSource,
+    DeepgramClientOptions,
 )
 import requests
 import threading
 import resend
 import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 
 from caption_styles import CaptionStyleFactory
+from face_detector import FaceDetectorPool
+from face_tracking import FaceTrack, DetectionScheduler, MODE_FACE, INTERPOLATION_TOLERANCE
+from frame_renderer import FrameRenderer, get_watermark
+from sharded_render import shard_ranges, track_shard, render_shard, concat_parts
+from clip_encoder import encode_clip
+from encoding_profiles import resolve_encoding_profile, encoding_options
+from ffmpeg_jobs import FfmpegJobPlan, PRECUT_VIDEO_ARGS, ASR_AUDIO_EXTENSION
+from s3_stream import S3MultipartSink
+from source_cache import SourceCache
+from transcript_cache import TranscriptCache, hash_audio
+from transcription import TranscriptionClient
+from word_alignment import WordAlignmentIndex
+from smart_cut import smart_cut, can_smart_cut, probe_video_stream
+from ffmpeg_render import build_crop_timeline, render_timeline, MAX_TIMELINE_RUNS
 from dotenv import find_dotenv, load_dotenv
 from proxy_manager import ProxyManager
 
@@ -30,34 +44,48 @@ ANTHROPIC_API_KEY = os.environ["ANTHROPIC_API_KEY"]
 DG_API_KEY = os.environ["DG_API_KEY"]
 
 class VideoProcessor:
-    def __init__(self):
-        # Add thread locks for shared resources
-        self._face_detection_lock = threading.Lock()
-        self._anthropic_lock = threading.Lock()
-        self._deepgram_lock = threading.Lock()
+    # Face framing constants (in frames)
+    FACE_DETECTION_THRESHOLD = 3
+    NO_DETECTION_THRESHOLD = 10
+    JITTER_THRESHOLD = 60
+
+    def __init__(self, source_cache_dir=None, transcript_cache_dir=None):
+        # Concurrent Claude requests across all jobs and transcript chunks, capped at
+        # ANTHROPIC_MAX_IN_FLIGHT to stay within the account's rate limits
+        self.ANTHROPIC_MAX_IN_FLIGHT = int(os.environ.get('ANTHROPIC_MAX_IN_FLIGHT', 6))
+        self._anthropic_slots = threading.BoundedSemaphore(self.ANTHROPIC_MAX_IN_FLIGHT)
         
         # Initialize proxy manager with its own lock
         self.proxy_manager = ProxyManager()
         
-        # Initialize S3 client
+        # Initialize S3 client (S3_ENDPOINT_URL points it at an S3-compatible store instead of AWS)
         self.s3_client = boto3.client('s3',
             aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
             aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.environ.get('AWS_REGION')
+            region_name=os.environ.get('AWS_REGION'),
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL')
         )
         
-        # Initialize clients in a thread-safe way
-        with self._face_detection_lock:
-            self.face_detection = mp.solutions.face_detection.FaceDetection(
-                model_selection=1, 
-                min_detection_confidence=0.5
-            )
-        
-        with self._anthropic_lock:
-            self.anthropic_client = Anthropic()
-            
-        with self._deepgram_lock:
-            self.deepgram_client = DeepgramClient(DG_API_KEY)
+        self.anthropic_client = Anthropic()
+
+        # DEEPGRAM_URL points the client at another endpoint (on-prem or a local stand-in)
+        self.deepgram_client = DeepgramClient(
+            DG_API_KEY,
+            DeepgramClientOptions(url=os.environ.get('DEEPGRAM_URL', ''))
+        )
+
+        # Up to DEEPGRAM_MAX_IN_FLIGHT transcriptions run at once across all jobs, each
+        # attempt timing out after DEEPGRAM_TIMEOUT seconds and tried DEEPGRAM_MAX_RETRIES times
+        self.transcription_client = TranscriptionClient(
+            self.deepgram_client,
+            max_in_flight=int(os.environ.get('DEEPGRAM_MAX_IN_FLIGHT', 4)),
+            timeout=float(os.environ.get('DEEPGRAM_TIMEOUT', 300)),
+            max_retries=int(os.environ.get('DEEPGRAM_MAX_RETRIES', 3)),
+            # Audio longer than LONG_AUDIO_SECONDS is transcribed in parallel chunks of
+            # about TRANSCRIPTION_CHUNK_SECONDS split at pauses (0 never chunks)
+            long_audio_seconds=float(os.environ.get('LONG_AUDIO_SECONDS', 1200)),
+            chunk_seconds=float(os.environ.get('TRANSCRIPTION_CHUNK_SECONDS', 300))
+        )
 
         resend.api_key = os.environ.get('RESEND_API_KEY')
         
@@ -81,12 +109,110 @@ class VideoProcessor:
             }
         }
         self.process_start_time = None
+
+        # Face detection scheduling: MediaPipe runs every FACE_DETECTION_STRIDE frames,
+        # or sooner when a frame moves more than FACE_MOTION_THRESHOLD (mean absolute
+        # difference, 0-255) away from the last detected frame. A stride of 1 detects every frame.
+        self.FACE_DETECTION_STRIDE = int(os.environ.get('FACE_DETECTION_STRIDE', 5))
+        self.FACE_MOTION_THRESHOLD = float(os.environ.get('FACE_MOTION_THRESHOLD', 6.0))
+
+        # Shot-aware framing: cuts are found with a histogram detector on a low-resolution
+        # stream, faces are sampled at the start of each shot and re-checked every
+        # SHOT_REDETECT_STRIDE frames, and shots whose detections agree get one fixed crop
+        self.FACE_SHOT_DETECTION = os.environ.get('FACE_SHOT_DETECTION', 'true').lower() == 'true'
+        self.SHOT_CUT_THRESHOLD = float(os.environ.get('SHOT_CUT_THRESHOLD', 0.4))
+        self.SHOT_REDETECT_STRIDE = int(os.environ.get('SHOT_REDETECT_STRIDE', 60))
+
+        # Frames wider than this are downscaled before face detection (0 detects at full resolution)
+        self.FACE_DETECTION_PROXY_WIDTH = int(os.environ.get('FACE_DETECTION_PROXY_WIDTH', 320))
+
+        # Portrait clips at least SHARDED_RENDER_MIN_DURATION seconds long are rendered
+        # across RENDER_SHARDS processes (1 disables sharding)
+        self.RENDER_SHARDS = int(os.environ.get('RENDER_SHARDS', os.cpu_count() or 1))
+        self.SHARDED_RENDER_MIN_DURATION = float(os.environ.get('SHARDED_RENDER_MIN_DURATION', 180))
+
+        # 'ffmpeg' renders portrait clips from a crop timeline in a single ffmpeg
+        # filter graph instead of frame by frame through moviepy
+        self.RENDER_ENGINE = os.environ.get('RENDER_ENGINE', 'moviepy').lower()
+
+        # 'pipe' streams final frames into one ffmpeg process that also muxes the
+        # source audio; 'moviepy' uses write_videofile
+        self.CLIP_ENCODER = os.environ.get('CLIP_ENCODER', 'pipe').lower()
+
+        # With the pipe encoder, clips are encoded as fragmented MP4 straight into an S3
+        # multipart upload in S3_UPLOAD_PART_MB parts, holding at most
+        # S3_UPLOAD_MAX_PENDING_PARTS parts in memory, instead of going through a local file
+        self.STREAM_UPLOADS = os.environ.get('STREAM_UPLOADS', 'true').lower() == 'true'
+        self.S3_UPLOAD_PART_MB = int(os.environ.get('S3_UPLOAD_PART_MB', 8))
+        self.S3_UPLOAD_MAX_PENDING_PARTS = int(os.environ.get('S3_UPLOAD_MAX_PENDING_PARTS', 2))
+
+        # Auto projects download only start_time..end_time from YouTube, plus
+        # DOWNLOAD_SECTION_MARGIN seconds of slack either side
+        self.DOWNLOAD_SECTIONS = os.environ.get('DOWNLOAD_SECTIONS', 'true').lower() == 'true'
+        self.DOWNLOAD_SECTION_MARGIN = float(os.environ.get('DOWNLOAD_SECTION_MARGIN', 5.0))
+
+        # Downloaded sources are shared between jobs and workers through source_cache_dir
+        # (SOURCE_CACHE_DIR when not given), up to SOURCE_CACHE_MAX_GB
+        source_cache_dir = source_cache_dir or os.environ.get('SOURCE_CACHE_DIR')
+        self.source_cache = None
+        if source_cache_dir:
+            self.source_cache = SourceCache(
+                source_cache_dir,
+                max_bytes=int(float(os.environ.get('SOURCE_CACHE_MAX_GB', 50)) * 1024 ** 3)
+            )
+
+        # Transcripts are cached by audio content in transcript_cache_dir (TRANSCRIPT_CACHE_DIR
+        # when not given), up to TRANSCRIPT_CACHE_MAX_MB
+        transcript_cache_dir = transcript_cache_dir or os.environ.get('TRANSCRIPT_CACHE_DIR')
+        self.transcript_cache = None
+        if transcript_cache_dir:
+            self.transcript_cache = TranscriptCache(
+                transcript_cache_dir,
+                max_bytes=int(float(os.environ.get('TRANSCRIPT_CACHE_MAX_MB', 500)) * 1024 ** 2)
+            )
+
+        # 'smart' makes frame-accurate cuts, re-encoding only the partial GOPs at each
+        # edge (H.264 sources only); 'copy' cuts on keyframes with a stream copy
+        self.CUT_MODE = os.environ.get('CUT_MODE', 'copy').lower()
+
+        # Auto projects extract each segment (plus PRECUT_MARGIN seconds either side)
+        # into a short file before rendering instead of seeking in the full source
+        self.PRECUT_SEGMENTS = os.environ.get('PRECUT_SEGMENTS', 'true').lower() == 'true'
+        self.PRECUT_MARGIN = float(os.environ.get('PRECUT_MARGIN', 1.0))
+
+        # Render workers of a project, segments times the shards each of them uses
+        # (0 sizes it from the CPUs and MemAvailable, allowing SEGMENT_RENDER_MEMORY_MB
+        # per worker); sharded renders only get what concurrent segments leave over
+        self.SEGMENT_RENDER_CONCURRENCY = int(os.environ.get('SEGMENT_RENDER_CONCURRENCY', 0))
+        self.SEGMENT_RENDER_MEMORY_MB = int(os.environ.get('SEGMENT_RENDER_MEMORY_MB', 1500))
+
+        # One detector per segment rendered at once, sized from the same budget (a
+        # positive FACE_DETECTOR_POOL_SIZE overrides it); segments beyond the pool
+        # size wait for a free detector, so they are never rendered more at a time
+        self.face_detector_pool = FaceDetectorPool(
+            size=int(os.environ.get('FACE_DETECTOR_POOL_SIZE', 0)) or self.render_budget(),
+            proxy_width=self.FACE_DETECTION_PROXY_WIDTH
+        )
     
     def download_video(self, source, path, quality, start_time, end_time, project_type="auto", clips=None, update_status_with_estimate=None, clerk_user_id=None, project_id=None, video_title=None, processing_timeframe=None):
         if not os.path.exists(path):
             os.makedirs(path)
 
         quality = quality.replace('p', '')
+
+        # Auto projects only fetch their time range (plus a margin) from YouTube; the
+        # section is cut with keyframes forced at its edges, so the downloaded file starts
+        # exactly at section_start (a copy cut would start at the previous keyframe) and
+        # cut times are rebased onto it
+        section_start = 0
+        download_sections = []
+        if (project_type == "auto" and self.DOWNLOAD_SECTIONS
+                and isinstance(source, str) and source.startswith(('http://', 'https://'))
+                and start_time is not None and end_time is not None and float(end_time) > float(start_time)):
+            section_start = max(0, float(start_time) - self.DOWNLOAD_SECTION_MARGIN)
+            section_end = float(end_time) + self.DOWNLOAD_SECTION_MARGIN
+            download_sections = ["--download-sections", f"*{section_start:.2f}-{section_end:.2f}",
+                                 "--force-keyframes-at-cuts"]
         
         if isinstance(source, str):
             # Clean up YouTube URL if it contains playlist parameters
@@ -125,166 +251,238 @@ class VideoProcessor:
                     raise Exception(f"Failed to download from S3: {str(e)}")
                 
             elif source.startswith(('http://', 'https://')):
-                success = False
-                max_retries = 3
-                retry_count = 0
-                
-                while retry_count < max_retries and not success:
-                    try:
-                        proxy_url = self.proxy_manager.get_proxy_url()
-                        print(f"Attempting download with proxy: {proxy_url}")
-                        
-
-                        # Get video title if not provided
-                        if not video_title:
-                            yt_dlp_cmd = ["yt-dlp", source, "--get-title", "--proxy", proxy_url]
-                            video_title = subprocess.check_output(
-                                yt_dlp_cmd, 
-                                universal_newlines=True,
-                                timeout=30
-                            ).strip()
-                        
-                        path = os.path.join(path, video_title)
-                        if not os.path.exists(path):
-                            os.makedirs(path)
-                        else:
-                            for file in os.listdir(path):
-                                file_path = os.path.join(path, file)
-                                if os.path.isfile(file_path):
-                                    os.remove(file_path)
-                        
-                        # Download command with progress
-                        download_cmd = [
-                            "yt-dlp",
-                            source,
-                            "-P",
-                            path,
-                            "-S",
-                            f"res:{quality}",
-                            "--output",
-                            "%(title)s.%(ext)s",
-                            "--proxy",
-                            proxy_url,
-                            "--progress",
-                            "--newline",
-                        ]
-                        
-                        process = subprocess.Popen(
-                            download_cmd,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT,
-                            universal_newlines=True,
-                            bufsize=1
-                        )
-
-                        # Track overall download state
-                        max_progress = 0
-                        current_progress = 0
-                        is_audio_phase = False
-                        for line in process.stdout:
-                            if '[download]' in line and '%' in line:
-                                try:
-                                    # Skip merger and destination lines
-                                    if any(x in line for x in ['Destination:', 'Merging formats']):
-                                        continue
-                                    
-                                    # Check if we've switched to audio download phase
-                                    if 'audio' in line.lower() or (max_progress > 95 and float(line.split('%')[0].split()[-1]) < 20):
-                                        is_audio_phase = True
-                                        
-                                    # Extract percentage from line
-                                    percent_part = line.split('%')[0]
-                                    percent_str = percent_part.split()[-1]
-                                    percent = float(percent_str)
-                                    
-                                    # Calculate overall progress based on phase
-                                    if is_audio_phase:
-                                        # Map audio progress (0-100) to overall progress (10-15)
-                                        overall_progress = 11 + int((percent * 5) / 100)
-                                    else:
-                                        # Map video progress (0-100) to overall progress (1-11)
-                                        overall_progress = 1 + int((percent * 10) / 100)
-                                    
-                                    # Keep track of maximum progress
-                                    if percent > max_progress and not is_audio_phase:
-                                        max_progress = percent
-                                    
-                                    # Only update if progress has changed significantly (every 2%)
-                                    if abs(percent - current_progress) >= 2:
-                                        current_progress = percent
-                                        # Ensure we never go backwards in progress
-                                        overall_progress = max(overall_progress, int((max_progress * 10) / 100))
-                                        
-                                        update_status_with_estimate("downloading", overall_progress)
-                                        print(f"Download progress: {percent:.1f}% (Overall: {overall_progress}/15)")
-                                        
-                                except (ValueError, IndexError) as e:
-                                    print(f"Error parsing progress: {str(e)} in line: {line}")
-                                    continue
-                        process.wait()
-                        if process.returncode == 0:
-                            success = True
+                if self.source_cache is None:
+                    video_path, video_title = self.download_with_ytdlp(
+                        source, path, quality, video_title, download_sections, update_status_with_estimate)
+                else:
+                    section = ' '.join(download_sections[1:]) if download_sections else None
+                    cache_key = self.source_cache.key(source, f"res:{quality}", quality, section)
+                    with self.source_cache.lock(cache_key):
+                        entry = self.source_cache.lookup(cache_key)
+                        if entry is None:
+                            video_path, video_title = self.download_with_ytdlp(
+                                source, path, quality, video_title, download_sections, update_status_with_estimate)
+                            self.source_cache.store(cache_key, video_path, video_title)
                         else:
-                            raise Exception("Download process failed")
-                    except Exception as e:
-                        print(f"Download attempt {retry_count + 1} failed: {str(e)}")
-                        print(f"Full error: {repr(e)}")
-                        self.proxy_manager.mark_failure(proxy_url)
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            time.sleep(3)
-                    
-                if not success:
-                    raise Exception("Failed to download video after maximum retries")
-                    
-                video_path = glob.glob(os.path.join(path, "*.*"))[0]
+                            # Cached by an earlier job: no download and no proxy traffic
+                            video_title = video_title or entry['title']
+                            path = self.prepare_download_folder(os.path.join(path, video_title))
+                            video_path = self.source_cache.materialize(entry, path)
+                if download_sections:
+                    print(f"Downloaded section starting at {section_start:.2f}s")
         
         # Process video based on project type
         if project_type == "auto":
+            if section_start:
+                start_time, end_time = float(start_time) - section_start, float(end_time) - section_start
             cut_video_path = self.cut_video(video_path, start_time, end_time, project_type)
             return video_path, cut_video_path, video_title
         else:  # manual
-            cut_video_paths = []
-            for clip in clips:
-                start = clip.get('start', clip.get('startTime'))
-                end = clip.get('end', clip.get('endTime'))
-                cut_path = self.cut_video(video_path, start, end, project_type)
-                cut_video_paths.append(cut_path)
+            ranges = [(clip.get('start', clip.get('startTime')), clip.get('end', clip.get('endTime'))) for clip in clips]
+            cut_video_paths = self.cut_clips(video_path, ranges)
             return video_path, cut_video_paths, video_title
 
+    def download_with_ytdlp(self, source, path, quality, video_title, download_sections, update_status_with_estimate):
+        """Download a URL with yt-dlp through the proxy pool; returns (video_path, video_title)"""
+        success = False
+        max_retries = 3
+        retry_count = 0
+        
+        while retry_count < max_retries and not success:
+            try:
+                proxy_url = self.proxy_manager.get_proxy_url()
+                print(f"Attempting download with proxy: {proxy_url}")
+                
+
+                # Get video title if not provided
+                if not video_title:
+                    yt_dlp_cmd = ["yt-dlp", source, "--get-title", "--proxy", proxy_url]
+                    video_title = subprocess.check_output(
+                        yt_dlp_cmd, 
+                        universal_newlines=True,
+                        timeout=30
+                    ).strip()
+                
+                path = self.prepare_download_folder(os.path.join(path, video_title))
+                
+                # Download command with progress
+                download_cmd = [
+                    "yt-dlp",
+                    source,
+                    "-P",
+                    path,
+                    "-S",
+                    f"res:{quality}",
+                    "--output",
+                    "%(title)s.%(ext)s",
+                    "--proxy",
+                    proxy_url,
+                    "--progress",
+                    "--newline",
+                ] + download_sections
+                
+                process = subprocess.Popen(
+                    download_cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    universal_newlines=True,
+                    bufsize=1
+                )
+
+                # Track overall download state
+                max_progress = 0
+                current_progress = 0
+                is_audio_phase = False
+                for line in process.stdout:
+                    if '[download]' in line and '%' in line:
+                        try:
+                            # Skip merger and destination lines
+                            if any(x in line for x in ['Destination:', 'Merging formats']):
+                                continue
+                            
+                            # Check if we've switched to audio download phase
+                            if 'audio' in line.lower() or (max_progress > 95 and float(line.split('%')[0].split()[-1]) < 20):
+                                is_audio_phase = True
+                                
+                            # Extract percentage from line
+                            percent_part = line.split('%')[0]
+                            percent_str = percent_part.split()[-1]
+                            percent = float(percent_str)
+                            
+                            # Calculate overall progress based on phase
+                            if is_audio_phase:
+                                # Map audio progress (0-100) to overall progress (10-15)
+                                overall_progress = 11 + int((percent * 5) / 100)
+                            else:
+                                # Map video progress (0-100) to overall progress (1-11)
+                                overall_progress = 1 + int((percent * 10) / 100)
+                            
+                            # Keep track of maximum progress
+                            if percent > max_progress and not is_audio_phase:
+                                max_progress = percent
+                            
+                            # Only update if progress has changed significantly (every 2%)
+                            if abs(percent - current_progress) >= 2:
+                                current_progress = percent
+                                # Ensure we never go backwards in progress
+                                overall_progress = max(overall_progress, int((max_progress * 10) / 100))
+                                
+                                update_status_with_estimate("downloading", overall_progress)
+                                print(f"Download progress: {percent:.1f}% (Overall: {overall_progress}/15)")
+                                
+                        except (ValueError, IndexError) as e:
+                            print(f"Error parsing progress: {str(e)} in line: {line}")
+                            continue
+                process.wait()
+                if process.returncode == 0:
+                    success = True
+                else:
+                    raise Exception("Download process failed")
+            except Exception as e:
+                print(f"Download attempt {retry_count + 1} failed: {str(e)}")
+                print(f"Full error: {repr(e)}")
+                self.proxy_manager.mark_failure(proxy_url)
+                retry_count += 1
+                if retry_count < max_retries:
+                    time.sleep(3)
+            
+        if not success:
+            raise Exception("Failed to download video after maximum retries")
+            
+        video_path = glob.glob(os.path.join(path, "*.*"))[0]
+        return video_path, video_title
+
+    def prepare_download_folder(self, path):
+        if not os.path.exists(path):
+            os.makedirs(path)
+        else:
+            for file in os.listdir(path):
+                file_path = os.path.join(path, file)
+                if os.path.isfile(file_path):
+                    os.remove(file_path)
+        return path
+
     def cut_video(self, video_path, start_time, end_time, project_type):
         video_extension = os.path.splitext(video_path)[1]
         
         if project_type == "auto":
-            # Cut video
+            # The ASR audio is extracted from the written cut (see extract_audio), as a stream-copied
+            # cut starts on the keyframe before start_time and the transcript must match the cut
             cut_video_path = video_path.replace(video_extension, f"_cut{video_extension}")
-            subprocess.run(["ffmpeg", "-i", video_path, "-ss", str(start_time), "-to", str(end_time), "-c", "copy", cut_video_path])
-            
-            # Extract and cut audio
-            cut_audio_path = cut_video_path.replace(video_extension, ".mp3")
-            subprocess.run(["ffmpeg", "-i", cut_video_path, "-q:a", "0", "-map", "a", cut_audio_path])
+            if self.use_smart_cut(video_path):
+                smart_cut(video_path, start_time, end_time, cut_video_path, os.path.dirname(cut_video_path))
+            else:
+                FfmpegJobPlan(video_path).add(start_time, end_time, cut_video_path).run()
             
-            # Remove original file only for auto type
+            # Remove original file only for auto type (a cached source is the job's own link or copy)
             os.remove(video_path)
             
-            print("Video cut and audio extracted successfully!")
+            print("Video cut successfully!")
             return cut_video_path
         else:
+            return self.cut_clips(video_path, [(start_time, end_time)])[0]
+
+    def cut_clips(self, video_path, ranges):
+        """Cut manual clips from the source in a single ffmpeg invocation (smart cuts are made one by one).
+
+        Manual clips are rendered from the source at their exact start, while a
+        stream-copied cut starts on the keyframe before it, so each clip's ASR
+        audio (asr_audio_path) is encoded from the exact range of the source.
+        """
+        video_extension = os.path.splitext(video_path)[1]
+        plan = FfmpegJobPlan(video_path)
+        smart = self.use_smart_cut(video_path)
+        cut_video_paths = []
+
+        for start_time, end_time in ranges:
             # For manual clips, create unique names
             clip_id = f"clip_{start_time:.2f}_{end_time:.2f}"
             cut_video_path = video_path.replace(video_extension, f"_{clip_id}{video_extension}")
-            subprocess.run(["ffmpeg", "-i", video_path, "-ss", str(start_time), "-to", str(end_time), "-c", "copy", cut_video_path])
-            
-            # Extract and cut audio
-            cut_audio_path = cut_video_path.replace(video_extension, ".mp3")
-            subprocess.run(["ffmpeg", "-i", cut_video_path, "-q:a", "0", "-map", "a", cut_audio_path])
-            
-            print(f"Clip {clip_id} cut and audio extracted successfully!")
-            return cut_video_path
+            if smart:
+                if not os.path.exists(cut_video_path):
+                    smart_cut(video_path, start_time, end_time, cut_video_path, os.path.dirname(cut_video_path))
+            # Re-encoded outputs of an input-side seek start exactly at start_time
+            plan.add(start_time, end_time, None if smart else cut_video_path, self.asr_audio_path(cut_video_path))
+            cut_video_paths.append(cut_video_path)
+
+        plan.run()
+        print(f"{len(cut_video_paths)} clips cut successfully!")
+        return cut_video_paths
+
+    def use_smart_cut(self, video_path):
+        """Whether cuts of this source are made frame-accurate with smart_cut"""
+        return self.CUT_MODE == 'smart' and can_smart_cut(video_path)
+
+    def precut_segments(self, video_path, segments):
+        """Extract each segment, with PRECUT_MARGIN either side, into its own short file.
+
+        All segments are written by one ffmpeg invocation that reads only their
+        ranges of the source. The files have a keyframe every second, so the
+        renderer's seeks stay cheap. Each segment gets 'source_path' and
+        'source_offset', the source time its file starts at.
+        """
+        base = os.path.splitext(video_path)[0]
+        plan = FfmpegJobPlan(video_path)
+
+        for segment in segments:
+            start = max(0, segment['start'] - self.PRECUT_MARGIN)
+            end = segment['end'] + self.PRECUT_MARGIN
+            segment_path = f"{base}_segment_{start:.2f}_{end:.2f}.mkv"
+            plan.add(start, end, segment_path, video_args=PRECUT_VIDEO_ARGS)
+            segment['source_path'] = segment_path
+            segment['source_offset'] = start
+
+        plan.run()
+        print(f"Pre-cut {len(segments)} segments")
+        return segments
+
+    def asr_audio_path(self, video_path):
+        return os.path.splitext(video_path)[0] + ASR_AUDIO_EXTENSION
 
     def extract_audio(self, video_path):
-        audio_path = os.path.splitext(video_path)[0] + ".mp3"
-        subprocess.run(["ffmpeg", "-i", video_path, "-q:a", "0", "-map", "a", audio_path])
+        # Read from the cut itself, so word timings line up with the video that is rendered
+        audio_path = self.asr_audio_path(video_path)
+        FfmpegJobPlan(video_path).add(audio_path=audio_path).run()
         print("Audio extracted successfully!")
         return audio_path
 
@@ -304,6 +502,9 @@ class VideoProcessor:
         # Calculate video duration
         total_duration = word_timings[-1]['end'] - word_timings[0]['start']
         duration_minutes = total_duration / 60
+
+        # Built once and used to locate every returned segment in word_timings
+        alignment_index = WordAlignmentIndex(word_timings)
         
         # For videos under 30 mins, process normally
         if duration_minutes <= 30:
@@ -312,7 +513,8 @@ class VideoProcessor:
                 word_timings,
                 clip_length,
                 keywords,
-                duration_minutes
+                duration_minutes,
+                alignment_index
             )
         
         # Calculate number of splits needed (roughly 30 min chunks)
@@ -324,30 +526,38 @@ class VideoProcessor:
         words_per_chunk = len(words) // num_splits
         overlap_words = 150  # Roughly 1 minute of speech
         
-        all_segments = []
-        
-        # Process each chunk
+        chunks = []
         for i in range(num_splits):
             start_idx = max(0, i * words_per_chunk - overlap_words if i > 0 else 0)
             end_idx = min(len(words), (i + 1) * words_per_chunk + overlap_words if i < num_splits - 1 else len(words))
-            
-            chunk_transcript = ' '.join(words[start_idx:end_idx])
-            chunk_duration = duration_minutes / num_splits + 2  # Add 2 minutes for overlap
-            
+            chunks.append(' '.join(words[start_idx:end_idx]))
+        chunk_duration = duration_minutes / num_splits + 2  # Add 2 minutes for overlap
+
+        def process_chunk(i, chunk_transcript):
             print(f"Processing chunk {i+1}/{num_splits} ({len(chunk_transcript.split())} words)")
-            
-            try:
-                chunk_segments = self._process_transcript_chunk(
-                    chunk_transcript,
-                    word_timings,
-                    clip_length,
-                    keywords,
-                    chunk_duration
-                )
-                all_segments.extend(chunk_segments)
-                
-            except Exception as e:
-                print(f"Error processing chunk {i+1}: {str(e)}")
+            return self._process_transcript_chunk(
+                chunk_transcript,
+                word_timings,
+                clip_length,
+                keywords,
+                chunk_duration,
+                alignment_index
+            )
+
+        # Chunks are analysed concurrently, up to ANTHROPIC_MAX_IN_FLIGHT at a time; a chunk
+        # that fails all its retries is skipped without holding up the others
+        chunk_segments = [[] for _ in chunks]
+        with ThreadPoolExecutor(max_workers=min(num_splits, self.ANTHROPIC_MAX_IN_FLIGHT)) as executor:
+            futures = {executor.submit(process_chunk, i, chunk): i for i, chunk in enumerate(chunks)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    chunk_segments[i] = future.result()
+                except Exception as e:
+                    print(f"Error processing chunk {i+1}: {str(e)}")
+
+        # Merged in chunk order so ties in start time resolve as before
+        all_segments = [segment for segments in chunk_segments for segment in segments]
         
         # Sort segments by start time
         all_segments.sort(key=lambda x: x['start'])
@@ -370,8 +580,12 @@ class VideoProcessor:
         print(f"Found {len(filtered_segments)} total segments after filtering")
         return filtered_segments
 
-    def _process_transcript_chunk(self, transcript_text, word_timings, clip_length, keywords="", duration_minutes=0):
+    def _process_transcript_chunk(self, transcript_text, word_timings, clip_length, keywords="", duration_minutes=0, alignment_index=None):
         """Process a single chunk of transcript - contains the original analysis logic"""
+        # Chunks of one transcript share the index built by get_interesting_segments
+        if alignment_index is None:
+            alignment_index = WordAlignmentIndex(word_timings)
+
         # Calculate expectations based on duration
         if duration_minutes <= 4:  # Short videos (≤ 4 minutes)
             min_segments = 1
@@ -455,7 +669,7 @@ class VideoProcessor:
                 Use the process_segments tool to return your analysis in the required format.
                 """
 
-                with self._anthropic_lock:
+                with self._anthropic_slots:
                     response = self.anthropic_client.messages.create(
                         model="claude-3-sonnet-20240229",
                         max_tokens=4096,
@@ -499,67 +713,51 @@ class VideoProcessor:
                         }],
                         tool_choice={"type": "tool", "name": "process_segments"}
                     )
-                    
-                    print("claude Response: ", response)
-                    tool_response = response.content[0].input
-                    segments = tool_response.get("segments", [])
-                    
-                    if not segments:
-                        raise ValueError("No segments returned by Claude")
-
-                    # Build the combined segment data
-                    segment_data = []
-                    for segment in segments:
-                        # Access dictionary values
-                        title = segment['title']
-                        text = segment['text']
-                        transcript = segment['transcript']
-                        word_timings_in_segment = []
-
-                        # Find the start and end times for the combined text
-                        words = text.lower().split()
-                        start_time = None
-                        end_time = None
-                        start = False
-
-                        for i in range(len(word_timings)):
-                            if start:
-                                word_timings_in_segment.append(word_timings[i])
-
-                            # Check if the first 10 words match
-                            if [wt['word'] for wt in word_timings[i:i+10]] == words[:10]:
-                                start_time = word_timings[i]['start']
-                                start = True
-                                word_timings_in_segment.append(word_timings[i])
-
-                            # Check if the last 10 words match
-                            if [wt['word'] for wt in word_timings[i:i+10]] == words[-10:]:
-                                end_time = word_timings[i+9]['end']
-                                word_timings_in_segment.extend(word_timings[i+1:i+10])
-                                break
-                        
-                        if start_time is None or end_time is None:
-                            continue
+                
+                print("claude Response: ", response)
+                tool_response = response.content[0].input
+                segments = tool_response.get("segments", [])
+                
+                if not segments:
+                    raise ValueError("No segments returned by Claude")
+
+                # Build the combined segment data
+                segment_data = []
+                for segment in segments:
+                    # Access dictionary values
+                    title = segment['title']
+                    text = segment['text']
+                    transcript = segment['transcript']
+
+                    # Find the start and end times for the combined text
+                    span = alignment_index.locate(text)
+                    if span is None:
+                        print(f"Could not locate segment '{title}' in the transcript, skipping")
+                        continue
+                    first, last = span
+                    start_time = word_timings[first]['start']
+                    end_time = word_timings[last]['end']
+                    word_timings_in_segment = word_timings[first:last + 1]
+
+                    segment_data.append({
+                        'title': title,
+                        'start': start_time,
+                        'end': end_time,
+                        'text': text,
+                        'transcript': transcript,
+                        'word_timings': word_timings_in_segment,
+                        'score': segment['score'],
+                        'hook': segment['hook'],
+                        'flow': segment['flow'],
+                        'engagement': segment['engagement'],
+                        'trend': segment['trend'],
+                        'hashtags': segment['hashtags'],
+                    })
 
-                        segment_data.append({
-                            'title': title,
-                            'start': start_time,
-                            'end': end_time,
-                            'text': text,
-                            'transcript': transcript,
-                            'word_timings': word_timings_in_segment,
-                            'score': segment['score'],
-                            'hook': segment['hook'],
-                            'flow': segment['flow'],
-                            'engagement': segment['engagement'],
-                            'trend': segment['trend'],
-                            'hashtags': segment['hashtags'],
-                        })
 
-                   
-                    print(f"Found {len(segment_data)} interesting segments!")
-                    return segment_data
-                    
+                print(f"Found {len(segment_data)} interesting segments!")
+                return segment_data
+                
             except Exception as e:
                 if attempt < max_retries - 1:  # If we have retries left
                     print(f"Attempt {attempt + 1} failed: {str(e)}")
@@ -570,78 +768,173 @@ class VideoProcessor:
                     print(f"All {max_retries} attempts failed. Last error: {str(e)}")
                     raise  # Re-raise the last exception if all retries failed
 
-    def detect_faces_and_pose(self, frame):
-        with self._face_detection_lock:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_results = self.face_detection.process(rgb_frame)
-            # pose_results = self.pose_detection.process(rgb_frame)
-            
-            face_bboxes = []
-            # pose_detected = False
-            
-            if face_results.detections:
-                for detection in face_results.detections:
-                    bbox = detection.location_data.relative_bounding_box
-                    x, y, w, h = bbox.xmin, bbox.ymin, bbox.width, bbox.height
-                    x, y, w, h = int(x * frame.shape[1]), int(y * frame.shape[0]), int(w * frame.shape[1]), int(h * frame.shape[0])
-                    face_bboxes.append((x, y, w, h))
-            
-            # if pose_results.pose_landmarks:
-            #     pose_detected = True
-            
-            return face_bboxes #pose_detected
+    def detect_faces_and_pose(self, frame, detector=None):
+        # Callers processing a whole clip pass the detector they checked out
+        if detector is None:
+            with self.face_detector_pool.checkout() as detector:
+                return detector.detect(frame)
+        return detector.detect(frame)
 
     def crop_and_add_subtitles(self, video_path, segments, output_video_type='portrait', caption_style='elon', 
                           output_folder='./subtitled_clips', s3_client=None, s3_bucket=None, 
                           user_id=None, project_id=None, debug=False, progress_callback=None, 
-                          add_watermark=False, project_type=None):
+                          add_watermark=False, project_type=None, encoding_profile=None):
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
-        
+
+        # Segments and the shards of sharded renders share one budget, so at most
+        # `budget` render workers (each with its own face detector) run at once
+        budget = self.render_budget()
+        concurrency = min(budget, max(1, len(segments)), self.face_detector_pool.size)
+        render_shards = min(self.RENDER_SHARDS, max(1, budget // concurrency))
+        print(f"Rendering {len(segments)} segments, {concurrency} at a time, up to {render_shards} shards each")
+
+        # Segments are saved concurrently, so each gets its own file name and S3 key
+        # even when titles are equal (or equal once sanitized)
+        for index, segment in enumerate(segments, start=1):
+            segment['output_name'] = f"{index:02d}_{segment['title']}"
+
+        # Each segment opens its own reader; clip data and progress are reported
+        # in completion order as soon as each clip is saved
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self.render_segment, video_path, segment, output_video_type, caption_style,
+                                output_folder, s3_client, s3_bucket, user_id, project_id, debug,
+                                add_watermark, project_type, encoding_profile, render_shards)
+                for segment in segments
+            ]
+            try:
+                for completed, future in enumerate(as_completed(futures), start=1):
+                    clip_data = future.result()
+                    if clip_data is not None:
+                        self.send_clip_data(clip_data)
+
+                    if progress_callback:
+                        progress_callback(completed)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def render_segment(self, video_path, segment, output_video_type, caption_style, output_folder,
+                       s3_client, s3_bucket, user_id, project_id, debug, add_watermark,
+                       project_type, encoding_profile, render_shards=None):
+        """Render, caption and save one segment; returns its clip data, or None if it is empty.
+
+        render_shards caps the processes of a sharded render (default RENDER_SHARDS).
+        """
+        if render_shards is None:
+            render_shards = self.RENDER_SHARDS
+
+        # Pre-cut segments are read from their own short file, which starts source_offset into the source
+        source_video_path = video_path
+        video_path = segment.get('source_path', video_path)
+        clip_start = segment['start'] - segment.get('source_offset', 0)
+        clip_end = segment['end'] - segment.get('source_offset', 0)
+        # segment['start'] is the segment's time in the original source
+        segment_start = segment['start']
+        # Unique per segment of the project (see crop_and_add_subtitles)
+        output_name = segment.get('output_name', segment['title'])
+
         video = mp_edit.VideoFileClip(video_path)
-        
-        for i, segment in enumerate(segments):
+        try:
             # For manual clips, skip subclipping since the video is already cut
-            
-            clip = self.process_segment(video, segment, video.duration)
+
+            clip = self.process_segment(video, dict(segment, start=clip_start, end=clip_end), video.duration)
             if clip is None:
-                continue
-            
-            processed_clip = self.process_clip(clip, output_video_type, add_watermark)
-            
-            if caption_style != "no_captions":
-                caption_styler = CaptionStyleFactory.get_style(caption_style)
-                subtitled_clip = caption_styler.add_subtitles(
-                    processed_clip, 
-                    segment['word_timings'], 
-                    0 if project_type == "manual" else segment['start'],  # Start from 0 for manual clips
-                    output_video_type
-                )
-            else:
-                subtitled_clip = processed_clip
-            
-            _, clip_url = self.save_or_upload_clip(subtitled_clip, segment['title'], 
-                                                 output_video_type, output_folder, 
-                                                 s3_client, s3_bucket, user_id, 
-                                                 project_id, debug)
-            
-            clip_data = {
-                'project_id': project_id,
-                'title': segment['title'],
-                'transcript': segment['transcript'],
-                's3_uri': clip_url,
-                'score': segment.get('score'),
-                'hook': segment.get('hook'),
-                'flow': segment.get('flow'),
-                'engagement': segment.get('engagement'),
-                'trend': segment.get('trend'),
-                'hashtags': segment.get('hashtags', [])
-            }
-            
-            self.send_clip_data(clip_data)
-            
-            if progress_callback:
-                progress_callback(i + 1)
+                return None
+
+            if self.can_copy_segment(source_video_path, output_video_type, caption_style, add_watermark):
+                # Nothing to draw on the frames: cut the segment straight from the original source,
+                # never from the pre-cut intermediate, whose near-lossless encode is not for delivery
+                _, clip_url = self.save_or_upload_cut(source_video_path, segment_start, segment_start + clip.duration,
+                                                      output_name, output_video_type, output_folder,
+                                                      s3_client, s3_bucket, user_id, project_id, debug)
+                return self.clip_data(segment, project_id, clip_url)
+
+            # Holds intermediate files of the ffmpeg and sharded renderers until the clip is saved
+            with tempfile.TemporaryDirectory(dir=output_folder) as work_dir:
+                if output_video_type == 'portrait' and self.RENDER_ENGINE == 'ffmpeg':
+                    processed_clip = self.process_clip_ffmpeg(clip, video_path, clip_start, work_dir, add_watermark)
+                elif self.use_sharded_render(clip, output_video_type, render_shards):
+                    processed_clip = self.process_clip_sharded(clip, video_path, clip_start, work_dir,
+                                                               add_watermark, render_shards)
+                else:
+                    processed_clip = self.process_clip(clip, output_video_type, add_watermark)
+
+                try:
+                    if caption_style != "no_captions":
+                        caption_styler = CaptionStyleFactory.get_style(caption_style)
+                        subtitled_clip = caption_styler.add_subtitles(
+                            processed_clip, 
+                            segment['word_timings'], 
+                            0 if project_type == "manual" else segment['start'],  # Start from 0 for manual clips
+                            output_video_type
+                        )
+                    else:
+                        subtitled_clip = processed_clip
+
+                    # Audio is read from the original source, never the pre-cut file: its PCM would
+                    # always be transcoded, while the source's own audio can be stream-copied
+                    _, clip_url = self.save_or_upload_clip(subtitled_clip, output_name, 
+                                                         output_video_type, output_folder, 
+                                                         s3_client, s3_bucket, user_id, 
+                                                         project_id, debug, encoding_profile,
+                                                         audio_source=(source_video_path, segment_start,
+                                                                       segment_start + clip.duration))
+                finally:
+                    # The ffmpeg and sharded renderers return a clip reading their rendered file;
+                    # other clips share the source's reader, which is closed with the video below
+                    reader = getattr(processed_clip, 'reader', None)
+                    if reader is not None and reader is not video.reader:
+                        reader.close()
+        finally:
+            video.close()
+
+        return self.clip_data(segment, project_id, clip_url)
+
+    def clip_data(self, segment, project_id, clip_url):
+        return {
+            'project_id': project_id,
+            'title': segment['title'],
+            'transcript': segment['transcript'],
+            's3_uri': clip_url,
+            'score': segment.get('score'),
+            'hook': segment.get('hook'),
+            'flow': segment.get('flow'),
+            'engagement': segment.get('engagement'),
+            'trend': segment.get('trend'),
+            'hashtags': segment.get('hashtags', [])
+        }
+
+    def can_copy_segment(self, video_path, output_video_type, caption_style, add_watermark):
+        """Landscape clips without captions or watermark need no re-encode when the source is already 1920x1080"""
+        if output_video_type == 'portrait' or caption_style != "no_captions" or add_watermark:
+            return False
+        if self.CUT_MODE != 'smart' or not can_smart_cut(video_path):
+            return False
+        stream = probe_video_stream(video_path)
+        return (stream['width'], stream['height']) == (1920, 1080)
+
+    def render_budget(self):
+        """Render workers at once: SEGMENT_RENDER_CONCURRENCY, or as many as the CPUs and available memory allow"""
+        if self.SEGMENT_RENDER_CONCURRENCY > 0:
+            return self.SEGMENT_RENDER_CONCURRENCY
+
+        by_cpu = os.cpu_count() or 1
+        available_mb = None
+        try:
+            with open('/proc/meminfo') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        available_mb = int(line.split()[1]) // 1024
+                        break
+        except OSError:
+            pass
+
+        if available_mb is None:
+            return by_cpu
+        return max(1, min(by_cpu, available_mb // self.SEGMENT_RENDER_MEMORY_MB))
 
     def process_segment(self, video, segment, video_duration):
         start = segment['start']
@@ -654,130 +947,157 @@ class VideoProcessor:
         
         return video.subclip(start, end)
 
+    def face_scheduler_options(self, stride=None, motion_threshold=None):
+        """Keyword arguments for the DetectionScheduler of a clip"""
+        if stride is None:
+            stride = self.SHOT_REDETECT_STRIDE if self.FACE_SHOT_DETECTION else self.FACE_DETECTION_STRIDE
+        if motion_threshold is None:
+            motion_threshold = self.FACE_MOTION_THRESHOLD
+
+        return {
+            'stride': stride,
+            'motion_threshold': motion_threshold,
+            'shot_cut_threshold': self.SHOT_CUT_THRESHOLD if self.FACE_SHOT_DETECTION else None,
+        }
+
+    def build_face_track(self, clip, stride=None, motion_threshold=None):
+        """Decode each frame of the clip once and record its face detections"""
+        frame_count = int(clip.duration * clip.fps)
+        track = FaceTrack(frame_count, clip.fps, clip.h, clip.w)
+        scheduler = DetectionScheduler(**self.face_scheduler_options(stride, motion_threshold))
+
+        with self.face_detector_pool.checkout() as detector:
+            for i in range(frame_count):
+                frame = clip.get_frame(i / clip.fps)
+                if scheduler.should_detect(i, frame):
+                    track.record(i, self.detect_faces_and_pose(frame, detector))
+                if scheduler.at_cut:
+                    track.shot_starts[i] = True
+
+        # Interpolate or hold boxes on the frames the scheduler skipped
+        track.fill_gaps()
+        return track
+
     # Smooth transitions b/w modes required for the video
     def process_clip(self, clip, output_video_type, add_watermark=False):
         if output_video_type != 'portrait':
             clip = clip.set_fps(clip.fps)
             return clip.resize((1920, 1080))
 
-        # Constants
-        FACE_DETECTION_THRESHOLD = 3
-        NO_DETECTION_THRESHOLD = 10
-        SMOOTHING_FACTOR = 0.8
-        JITTER_THRESHOLD = 60
-
         clip = clip.set_fps(clip.fps)
-        frame_count = int(clip.duration * clip.fps)
-        
-        # First pass: Decide mode for each frame
-        modes = []
-        face_detection_counter = 0
-        no_detection_counter = 0
-        is_initial_phase = True
-
-        for t in range(frame_count):
-            frame = clip.get_frame(t / clip.fps)
-            faces = self.detect_faces_and_pose(frame)
-
-            if is_initial_phase:
-                if len(faces) == 1:
-                    face_detection_counter += 1
-                    if face_detection_counter >= FACE_DETECTION_THRESHOLD:
-                        is_initial_phase = False
-                    modes.append('face')
-                else:
-                    no_detection_counter += 1
-                    if no_detection_counter >= NO_DETECTION_THRESHOLD:
-                        is_initial_phase = False
-                    modes.append('full')
-            else:
-                if len(faces) == 1:
-                    face_detection_counter += 1
-                    no_detection_counter = 0
-                else:
-                    face_detection_counter = 0
-                    no_detection_counter += 1
 
-                if face_detection_counter >= FACE_DETECTION_THRESHOLD:
-                    modes.append('face')
-                elif no_detection_counter >= NO_DETECTION_THRESHOLD:
-                    modes.append('full')
-                else:
-                    modes.append(modes[-1] if modes else 'full')
+        # Decode and detect every frame once; the mode pass, jitter filter
+        # and render pass all read from the resulting track
+        track = self.build_face_track(clip)
+        if track.frame_count == 0:
+            return clip.resize((1080, 1920))
 
-        # Second pass: Filter out jitter
-        filtered_modes = []
-        current_mode = modes[0]
-        mode_duration = 0
+        self.plan_face_track(track)
+        return self.render_track(clip, track, add_watermark)
 
-        for mode in modes:
-            if mode == current_mode:
-                mode_duration += 1
-            else:
-                if mode_duration >= JITTER_THRESHOLD:
-                    filtered_modes.extend([current_mode] * mode_duration)
-                else:
-                    filtered_modes.extend([filtered_modes[-1] if filtered_modes else current_mode] * mode_duration)
-                current_mode = mode
-                mode_duration = 1
+    def render_track(self, clip, track, add_watermark=False):
+        """Render a planned track frame by frame through FrameRenderer"""
+        watermark = get_watermark(track.frame_height) if add_watermark else None
+        renderer = FrameRenderer(watermark=watermark)
 
-        # Add the last mode
-        if mode_duration >= JITTER_THRESHOLD:
-            filtered_modes.extend([current_mode] * mode_duration)
-        else:
-            filtered_modes.extend([filtered_modes[-1] if filtered_modes else current_mode] * mode_duration)
+        def process_frame(get_frame, t):
+            frame_index = track.index_at(t)
+            return renderer.render(get_frame(t), track.modes[frame_index], track.crop(frame_index))
 
-        # Third pass: Generate frames
-        last_valid_face = None
-        gradient_colors = None
-
-        # Load and prepare the watermark
-        if add_watermark:
-            target_height = frame.shape[0]  # Assuming 'frame' is your input image/video frame
-            watermark = cv2.imread('/Users/parassavnani/Desktop/dev/Lunaris/backend/watermark.png', cv2.IMREAD_UNCHANGED)
-            watermark_height = int(target_height * 0.05)  # 5% of frame height
-            aspect_ratio = watermark.shape[1] / watermark.shape[0]
-            watermark_width = int(watermark_height * aspect_ratio)
-            watermark = cv2.resize(watermark, (watermark_width, watermark_height))
-
-            # Separate the alpha channel and convert to float
-            watermark_alpha = watermark[:, :, 3].astype(float) / 255.0
-            watermark_alpha = np.expand_dims(watermark_alpha, axis=2)
-            watermark_rgb = watermark[:, :, :3].astype(float) / 255.0
+        return clip.fl(process_frame)
 
-        def process_frame(get_frame, t):
-            nonlocal last_valid_face, gradient_colors
+    def process_clip_ffmpeg(self, clip, video_path, clip_start, work_dir, add_watermark=False):
+        """Render a portrait clip with ffmpeg from its planned crop timeline.
 
-            frame = get_frame(t)
-            frame_index = int(t * clip.fps)
-            
-            # Ensure frame_index is within bounds
-            if frame_index >= len(filtered_modes):
-                print(f"Warning: frame_index {frame_index} exceeds filtered_modes length {len(filtered_modes)}. Using last known mode.")
-                current_mode = filtered_modes[-1]  # Use the last known mode
-            else:
-                current_mode = filtered_modes[frame_index]
+        Frames are decoded in Python only for face tracking; the crop, scale,
+        letterbox and watermark run in one ffmpeg filter graph. Returns a clip
+        of the rendered video with the source audio.
+        """
+        clip = clip.set_fps(clip.fps)
+        track = self.build_face_track(clip)
+        if track.frame_count == 0:
+            return clip.resize((1080, 1920))
+
+        self.plan_face_track(track)
+        timeline = build_crop_timeline(track, lambda index: clip.get_frame(index / clip.fps))
+        if len(timeline) > MAX_TIMELINE_RUNS:
+            print(f"Crop timeline has {len(timeline)} runs, rendering frame by frame")
+            return self.render_track(clip, track, add_watermark)
+
+        print(f"Rendering {track.frame_count} frames from a {len(timeline)}-run crop timeline")
+        rendered_path = render_timeline(
+            video_path, clip_start, clip.fps, track.frame_count, (clip.w, clip.h),
+            timeline, os.path.join(work_dir, "rendered.mp4"), add_watermark
+        )
+        return mp_edit.VideoFileClip(rendered_path, audio=False).set_audio(clip.audio)
+
+    def use_sharded_render(self, clip, output_video_type, render_shards):
+        return (output_video_type == 'portrait'
+                and render_shards > 1
+                and clip.duration >= self.SHARDED_RENDER_MIN_DURATION)
 
-            frame_height, frame_width, _ = frame.shape
-            target_width, target_height = (1080, 1920)
+    def process_clip_sharded(self, clip, video_path, clip_start, work_dir, add_watermark=False, render_shards=None):
+        """Render a long portrait clip with each contiguous frame range in its own process.
 
-            faces = self.detect_faces_and_pose(frame)
+        Shards decode and detect their own range, the parent stitches the raw
+        detections into one track and plans modes and crops over the whole clip,
+        then shards render their range and the parts are concatenated without
+        re-encoding. Returns a clip of the rendered video with the source audio.
+        """
+        clip = clip.set_fps(clip.fps)
+        frame_count = int(clip.duration * clip.fps)
+        ranges = shard_ranges(frame_count, render_shards or self.RENDER_SHARDS)
+        print(f"Rendering {frame_count} frames in {len(ranges)} shards")
+
+        # Spawned processes: forking a process that runs detector and encoder threads is unsafe
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as executor:
+            # Track pass
+            futures = [
+                executor.submit(track_shard, video_path, clip_start, clip.fps, frame_range,
+                                self.face_scheduler_options(), self.FACE_DETECTION_PROXY_WIDTH)
+                for frame_range in ranges
+            ]
+            track = FaceTrack(frame_count, clip.fps, clip.h, clip.w)
+            for (start, _), future in zip(ranges, futures):
+                track.merge_detections(start, *future.result())
+
+            track.fill_gaps()
+            self.plan_face_track(track)
+
+            # Render pass
+            watermark_height = track.frame_height if add_watermark else None
+            futures = [
+                executor.submit(render_shard, video_path, clip_start, clip.fps, (start, end),
+                                track.modes[start:end], track.crops[start:end], track.has_crop[start:end],
+                                watermark_height, os.path.join(work_dir, f"part_{n:03d}.mp4"))
+                for n, (start, end) in enumerate(ranges)
+            ]
+            part_paths = [future.result() for future in futures]
+
+        rendered_path = concat_parts(part_paths, os.path.join(work_dir, "rendered.mp4"))
+        return mp_edit.VideoFileClip(rendered_path, audio=False).set_audio(clip.audio)
+
+    def plan_face_track(self, track):
+        """Decide the mode and face crop of every frame from the track's detections"""
+        if self.FACE_SHOT_DETECTION:
+            track.stabilize_shots(INTERPOLATION_TOLERANCE * track.frame_width)
 
-            if current_mode == 'face':
-                processed_frame, last_valid_face = self.process_face_frame(frame, faces, last_valid_face, frame_height, frame_width, target_width, target_height, SMOOTHING_FACTOR)
-            else:  # 'full' mode
-                processed_frame = self.create_landscape_frame(frame, target_width, target_height, gradient_colors)
+        # First pass: Decide mode for each frame
+        track.assign_modes(self.FACE_DETECTION_THRESHOLD, self.NO_DETECTION_THRESHOLD)
 
-            gradient_colors = self.update_gradient_colors(processed_frame)
-            
-            if add_watermark:
-                processed_frame = self.add_watermark(processed_frame, watermark_rgb, watermark_alpha)
-                     
-            return processed_frame
+        # Second pass: Filter out jitter
+        track.filter_jitter(self.JITTER_THRESHOLD)
 
-        return clip.fl(process_frame)
+        # Third pass: Follow the face through the face-mode frames in order
+        last_valid_face = None
+        for i in np.flatnonzero(track.modes == MODE_FACE).tolist():
+            last_valid_face = self.update_face_box(track.faces(i), last_valid_face, track.frame_height, track.frame_width)
+            if last_valid_face is not None:
+                track.crops[i] = last_valid_face
+                track.has_crop[i] = True
 
-    def process_face_frame(self, frame, faces, last_valid_face, frame_height, frame_width, target_width, target_height, smoothing_factor):
+    def update_face_box(self, faces, last_valid_face, frame_height, frame_width, smoothing_factor=0.8):
         if faces:
             face = faces[0]
             (x, y, w, h) = face
@@ -797,86 +1117,104 @@ class VideoProcessor:
                 # Apply smoothing only for moderate changes
                 # last_valid_face = self.smooth_bounding_box(last_valid_face, new_box, smoothing_factor)
 
-        if last_valid_face:
-            x, y, w, h = last_valid_face
-            face_crop = frame[y:y+h, x:x+w]
-            return cv2.resize(face_crop, (target_width, target_height)), last_valid_face
-        else:
-            return self.create_landscape_frame(frame, target_width, target_height, None), None
+        return last_valid_face
 
     def blend_frames(self, frame1, frame2, alpha):
         return cv2.addWeighted(frame1, alpha, frame2, 1 - alpha, 0)
 
-    def create_landscape_frame(self, frame, target_width, target_height, gradient_colors):
-        aspect_ratio = frame.shape[1] / frame.shape[0]
-        new_height = int(target_width / aspect_ratio)
-        resized_frame = cv2.resize(frame, (target_width, new_height))
-        
-        processed_frame = np.zeros((target_height, target_width, 3), dtype=np.uint8)
-        
-        y_offset = (target_height - new_height) // 2
-        processed_frame[y_offset:y_offset+new_height, :] = resized_frame
-        
-        if gradient_colors is None:
-            gradient_colors = {
-                'top': np.median(resized_frame[:10, :], axis=(0, 1)).astype(np.uint8),
-                'bottom': np.median(resized_frame[-10:, :], axis=(0, 1)).astype(np.uint8)
-            }
+    def save_or_upload_clip(self, clip, title, output_video_type, output_folder, s3_client, s3_bucket, user_id, project_id, debug=False, encoding_profile=None, audio_source=None):
+        filename = self.clip_filename(title, user_id, project_id, output_video_type)
+        local_path = os.path.join(output_folder, filename)
         
-        for i in range(y_offset):
-            alpha = i / y_offset
-            processed_frame[i] = (1 - alpha) * gradient_colors['top'] + alpha * gradient_colors['top']
-            processed_frame[target_height - i - 1] = (1 - alpha) * gradient_colors['bottom'] + alpha * gradient_colors['bottom']
+        # Ensure the output directory exists
+        os.makedirs(output_folder, exist_ok=True)
         
-        return processed_frame
+        options = encoding_options(resolve_encoding_profile(encoding_profile))
+        if self.CLIP_ENCODER == 'pipe' and self.STREAM_UPLOADS and not debug:
+            return self.stream_upload_clip(clip, filename, options, audio_source, s3_client, s3_bucket, user_id, project_id)
 
-    def update_gradient_colors(self, frame):
-        return {
-            'top': np.median(frame[:10, :], axis=(0, 1)).astype(np.uint8),
-            'bottom': np.median(frame[-10:, :], axis=(0, 1)).astype(np.uint8)
-        }
+        try:
+            if self.CLIP_ENCODER == 'pipe':
+                stats = encode_clip(clip, local_path, options, audio_source if clip.audio is not None else None)
+                print(f"Encoded {stats['frames']} frames at {stats['fps']:.1f} fps "
+                      f"({stats['backpressure']:.0%} of the time waiting on the encoder)")
+            else:
+                clip.write_videofile(local_path, **options)
+        except Exception as e:
+            print(f"Failed to write video file: {str(e)}")
+            raise
 
-    def save_or_upload_clip(self, clip, title, output_video_type, output_folder, s3_client, s3_bucket, user_id, project_id, debug=False):
-        # Sanitize the title by replacing problematic characters
-        safe_title = title.replace('/', '-').replace('\\', '-').replace(':', '-')
-        
-        # Create the filename
-        filename = f"{user_id}_{project_id}_{safe_title}_{output_video_type}.mp4"
+        return self.upload_clip_file(local_path, filename, s3_client, s3_bucket, user_id, project_id, debug)
+
+    def stream_upload_clip(self, clip, filename, options, audio_source, s3_client, s3_bucket, user_id, project_id):
+        """Encode a clip as fragmented MP4 straight into an S3 multipart upload, without a local file"""
+        s3_key = f"{user_id}/{project_id}/{filename}"
+        sink = None
+        try:
+            sink = S3MultipartSink(s3_client, s3_bucket, s3_key,
+                                   part_size=self.S3_UPLOAD_PART_MB * 1024 * 1024,
+                                   max_pending=self.S3_UPLOAD_MAX_PENDING_PARTS)
+            stats = encode_clip(clip, s3_key, options, audio_source if clip.audio is not None else None, sink=sink)
+            print(f"Encoded and uploaded {stats['frames']} frames ({sink.bytes_written / (1024 * 1024):.1f} MB) "
+                  f"at {stats['fps']:.1f} fps ({stats['backpressure']:.0%} of the time waiting on the encoder)")
+        except Exception as e:
+            print(f"Failed to upload to S3: {str(e)}")
+            # The encoder aborts the sink once it runs; this covers failures before it started
+            if sink is not None:
+                sink.abort()
+            raise
+
+        return s3_key, self.presign_clip(s3_client, s3_bucket, s3_key)
+
+    def presign_clip(self, s3_client, s3_bucket, s3_key):
+        # Generate presigned URL (expires in 30 days)
+        presigned_url = s3_client.generate_presigned_url('get_object',
+            Params={
+                'Bucket': s3_bucket,
+                'Key': s3_key
+            },
+            ExpiresIn= 3600 * 24 *30  # 30 days in seconds
+        )
+        print(f"Presigned URL: {presigned_url}")
+        return presigned_url
+
+    def save_or_upload_cut(self, video_path, start, end, title, output_video_type, output_folder, s3_client, s3_bucket, user_id, project_id, debug=False):
+        """Save a segment smart-cut from the source without re-encoding the frames in between"""
+        filename = self.clip_filename(title, user_id, project_id, output_video_type)
         local_path = os.path.join(output_folder, filename)
-        
-        # Ensure the output directory exists
         os.makedirs(output_folder, exist_ok=True)
-        
+
         try:
-            clip.write_videofile(local_path)
-            if debug:
-                return local_path, f"file://{local_path}"
-            
-            try:
-                # Upload to S3
-                s3_key = f"{user_id}/{project_id}/{filename}"
-                s3_client.upload_file(local_path, s3_bucket, s3_key)
-                
-                # Generate presigned URL (expires in 30 days)
-                presigned_url = s3_client.generate_presigned_url('get_object',
-                    Params={
-                        'Bucket': s3_bucket,
-                        'Key': s3_key
-                    },
-                    ExpiresIn= 3600 * 24 *30  # 30 days in seconds
-                )
-                print(f"Presigned URL: {presigned_url}")
-                # Clean up local file
-                os.remove(local_path)
-                
-                return s3_key, presigned_url
-            except Exception as e:
-                print(f"Failed to upload to S3: {str(e)}")
-                raise
+            smart_cut(video_path, start, end, local_path, output_folder)
         except Exception as e:
             print(f"Failed to write video file: {str(e)}")
             raise
 
+        return self.upload_clip_file(local_path, filename, s3_client, s3_bucket, user_id, project_id, debug)
+
+    def clip_filename(self, title, user_id, project_id, output_video_type):
+        # Sanitize the title by replacing problematic characters
+        safe_title = title.replace('/', '-').replace('\\', '-').replace(':', '-')
+        return f"{user_id}_{project_id}_{safe_title}_{output_video_type}.mp4"
+
+    def upload_clip_file(self, local_path, filename, s3_client, s3_bucket, user_id, project_id, debug=False):
+        if debug:
+            return local_path, f"file://{local_path}"
+
+        try:
+            # Upload to S3
+            s3_key = f"{user_id}/{project_id}/{filename}"
+            s3_client.upload_file(local_path, s3_bucket, s3_key)
+            presigned_url = self.presign_clip(s3_client, s3_bucket, s3_key)
+
+            # Clean up local file
+            os.remove(local_path)
+            
+            return s3_key, presigned_url
+        except Exception as e:
+            print(f"Failed to upload to S3: {str(e)}")
+            raise
+
     def adjust_bounding_box(self, x, y, w, h, frame_height, frame_width):
         # Target aspect ratio (9:16)
         target_aspect_ratio = 9 / 16
@@ -971,36 +1309,38 @@ class VideoProcessor:
 
     def transcribe_audio(self, audio_path):
         print("Transcribing audio...")
-        
-        with open(audio_path, "rb") as file:
-            buffer_data = file.read()
-
-        payload: FileSource = {
-            "buffer": buffer_data,
-        }
 
-        options = PrerecordedOptions(
-            model="nova-2",
-            smart_format=True
-        )
-
-        with self._deepgram_lock:
-            response = self.deepgram_client.listen.prerecorded.v("1").transcribe_file(payload, options, timeout=httpx.Timeout(300.0, connect=10.0))
+        transcription_options = {'model': 'nova-2', 'smart_format': True}
+        cache_key = None
+        if self.transcript_cache is not None:
+            cache_key = hash_audio(audio_path, transcription_options)
+            cached = self.transcript_cache.lookup(cache_key)
+            if cached is not None:
+                print("Audio transcript loaded from cache")
+                return cached
 
+        words = []
         word_timings = []
         full_transcript = ''
         
-        for word in response.results.channels[0].alternatives[0].words:
+        for word, start, end in self.transcription_client.transcribe_words(audio_path, transcription_options):
+            words.append(word)
             word_timings.append({
-                'start': word.start,
-                'end': word.end,
-                'word': word.word.strip().lower()
+                'start': start,
+                'end': end,
+                'word': word.strip().lower()
             })
-            full_transcript += word.word + ' '
+            full_transcript += word + ' '
         
         full_transcript = full_transcript.strip()
         # with open("transcript.txt", 'w') as file:
         #     file.write(full_transcript)
+
+        if cache_key is not None:
+            try:
+                self.transcript_cache.store(cache_key, words, word_timings)
+            except OSError as e:
+                print(f"Failed to cache transcript: {str(e)}")
         
         print("Audio transcribed successfully!")
         return full_transcript, word_timings
@@ -1013,26 +1353,6 @@ class VideoProcessor:
         except Exception as e:
             print(f"Failed to send clip data: {str(e)}")
 
-    def add_watermark(self, frame, watermark_rgb, watermark_alpha):
-        frame_height, frame_width = frame.shape[:2]
-        watermark_height, watermark_width = watermark_rgb.shape[:2]
-
-        # Calculate position (bottom-right corner with a small margin)
-        margin = 10
-        y = frame_height - watermark_height - margin
-        x = frame_width - watermark_width - margin
-
-        # Extract the region of interest (ROI) from the frame
-        roi = frame[y:y+watermark_height, x:x+watermark_width].astype(float) / 255.0
-
-        # Blend the watermark with the ROI
-        blended = (1.0 - watermark_alpha) * roi + watermark_alpha * watermark_rgb
-
-        # Put the blended image back into the frame
-        frame[y:y+watermark_height, x:x+watermark_width] = (blended * 255).astype(np.uint8)
-
-        return frame
-
     def calculate_total_estimate(self, video_duration, elapsed_time=0, progress=0, stage="", quality="720p"):
         """Calculate remaining time based on progress percentage and elapsed time"""
         # Standardize quality format and default to 720p if invalid
@@ -1077,8 +1397,12 @@ class VideoProcessor:
                      user_email=None, video_title=None, processing_timeframe=None, 
                      video_quality="720p", video_type="portrait", video_duration=None, start_time=None, end_time=None, 
                      clip_length=None, keywords="", caption_style="elon", add_watermark=False,
-                     update_status_callback=None, s3_client=None, s3_bucket=None, project_type="auto", clips=None):
+                     update_status_callback=None, s3_client=None, s3_bucket=None, project_type="auto", clips=None,
+                     encoding_profile=None):
         try:
+            # A profile named in the job wins over the one implied by the download quality
+            encoding_profile = resolve_encoding_profile(encoding_profile, video_quality)
+
             # Standardize clip format at the beginning of processing
             if clips and isinstance(clips, str):
                 clips = json.loads(clips)
@@ -1142,6 +1466,8 @@ class VideoProcessor:
                         return []
                     
                     segments_to_process = interesting_data
+                    if self.PRECUT_SEGMENTS:
+                        self.precut_segments(downloaded_video_path, segments_to_process)
                     
                 else:  # manual clip processing
                     downloaded_video_path, downloaded_video_paths, video_title = self.download_video(
@@ -1191,7 +1517,8 @@ class VideoProcessor:
                     debug=False,
                     progress_callback=progress_callback,
                     add_watermark=add_watermark,
-                    project_type=project_type
+                    project_type=project_type,
+                    encoding_profile=encoding_profile
                 )
 
                 # Cleanup and completion
@@ -1290,7 +1617,7 @@ class VideoProcessor:
                 Use the process_metrics tool to return your analysis.
                 """
 
-                with self._anthropic_lock:
+                with self._anthropic_slots:
                     response = self.anthropic_client.messages.create(
                         model="claude-3-sonnet-20240229",
                         max_tokens=1000,
@@ -1321,15 +1648,15 @@ class VideoProcessor:
                         }],
                         tool_choice={"type": "tool", "name": "process_metrics"}
                     )
-                    
-                    result = response.content[0].input
-                    # Validate the required fields are present
-                    required_fields = ["title", "transcript", "score", "hook", "flow", "engagement", "trend"]
-                    if not all(field in result for field in required_fields):
-                        raise ValueError("Missing required fields in Claude response")
-                    
-                    return result
-                    
+                
+                result = response.content[0].input
+                # Validate the required fields are present
+                required_fields = ["title", "transcript", "score", "hook", "flow", "engagement", "trend"]
+                if not all(field in result for field in required_fields):
+                    raise ValueError("Missing required fields in Claude response")
+                
+                return result
+                
             except Exception as e:
                 if attempt < max_retries - 1:  # If we have retries left
                     print(f"Metrics attempt {attempt + 1} failed: {str(e)}")
@@ -1344,8 +1671,9 @@ class VideoProcessor:
         segments_to_process = []
         
         for i, (clip_path, clip_data) in enumerate(zip(downloaded_video_paths, clips)):
-            # Get audio and transcript
-            audio_path = self.extract_audio(clip_path)
+            # Audio written by cut_clips from the clip's exact range of the source, which
+            # the clip is rendered from, so word timings start at clip_data['start']
+            audio_path = self.asr_audio_path(clip_path)
             transcript, word_timings = self.transcribe_audio(audio_path)
             
             # Get metrics from Claude
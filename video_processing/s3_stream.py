@@ -0,0 +1,129 @@
+import queue
+import threading
+
+# S3 requires every part but the last to be at least 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3MultipartSink:
+    """A write-only stream uploaded to S3 as a multipart upload while it is written.
+
+    Written bytes are gathered into parts of part_size and uploaded by a
+    background thread. At most max_pending parts wait in memory; when the
+    upload falls behind, write blocks instead of buffering more. Any failure
+    aborts the multipart upload so no orphaned parts are left in the bucket.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=8 * 1024 * 1024, max_pending=2, content_type='video/mp4'):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(MIN_PART_SIZE, int(part_size))
+        self.bytes_written = 0
+
+        self._buffer = bytearray()
+        self._next_part = 1
+        self._etags = {}
+        self._error = None
+        self._closed = False
+        self._pending = queue.Queue(maxsize=max(1, int(max_pending)))
+
+        response = s3_client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        self.upload_id = response['UploadId']
+        self._uploader = threading.Thread(target=self._upload_parts, daemon=True)
+        self._uploader.start()
+
+    def write(self, data):
+        try:
+            self._raise_if_failed()
+            self._buffer += data
+            self.bytes_written += len(data)
+            while len(self._buffer) >= self.part_size:
+                self._queue_part(bytes(self._buffer[:self.part_size]))
+                del self._buffer[:self.part_size]
+        except Exception:
+            self.abort()
+            raise
+        return len(data)
+
+    def close(self):
+        """Upload the remaining bytes and complete the upload"""
+        if self._closed:
+            return
+        try:
+            if self._buffer or self._next_part == 1:
+                self._queue_part(bytes(self._buffer))
+                self._buffer = bytearray()
+        except Exception:
+            self.abort()
+            raise
+        self._pending.put(None)
+        self._uploader.join()
+        self._closed = True
+
+        if self._error is not None:
+            self._abort_upload()
+            raise Exception(f"Failed to upload s3://{self.bucket}/{self.key}: {self._error}")
+
+        parts = [{'PartNumber': number, 'ETag': etag} for number, etag in sorted(self._etags.items())]
+        try:
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except Exception:
+            self._abort_upload()
+            raise
+
+    def abort(self):
+        """Stop uploading and discard the parts uploaded so far"""
+        if self._closed:
+            return
+        self._closed = True
+        self._error = self._error or Exception("upload aborted")
+        # Drain the queue so the uploader is not left blocked, then stop it
+        while True:
+            try:
+                self._pending.get_nowait()
+            except queue.Empty:
+                break
+        self._pending.put(None)
+        self._uploader.join()
+        self._abort_upload()
+
+    def _queue_part(self, data):
+        while True:
+            self._raise_if_failed()
+            try:
+                self._pending.put((self._next_part, data), timeout=1)
+                break
+            except queue.Full:
+                continue
+        self._next_part += 1
+
+    def _upload_parts(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue
+            number, data = item
+            try:
+                response = self.s3_client.upload_part(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                    PartNumber=number, Body=data
+                )
+                self._etags[number] = response['ETag']
+            except Exception as e:
+                self._error = e
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise Exception(f"Failed to upload s3://{self.bucket}/{self.key}: {self._error}")
+
+    def _abort_upload(self):
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            print(f"Failed to abort multipart upload of {self.key}: {str(e)}")
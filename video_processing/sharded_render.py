@@ -0,0 +1,97 @@
+import os
+import subprocess
+
+import moviepy.editor as mp_edit
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from face_detector import FaceDetector
+from face_tracking import FaceTrack, DetectionScheduler
+from frame_renderer import FrameRenderer, get_watermark
+
+# Parts are encoded once more when captions are composited, so they are
+# written near-lossless with a fast preset
+SHARD_PRESET = 'veryfast'
+SHARD_FFMPEG_PARAMS = ['-crf', '12', '-pix_fmt', 'yuv420p']
+
+# The functions below run in worker processes: each opens its own decoder
+# and detector and only exchanges small arrays with the parent.
+
+
+def shard_ranges(frame_count, shards):
+    """Split frame_count frames into up to `shards` contiguous (start, end) ranges"""
+    shards = max(1, min(shards, frame_count))
+    bounds = [round(i * frame_count / shards) for i in range(shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def track_shard(video_path, clip_start, fps, frame_range, scheduler_options, proxy_width):
+    """Decode and detect faces for one frame range of a clip.
+
+    Only raw detections are returned; gap filling, modes and crops are computed
+    by the parent over the whole clip, so tracking state carries across shards.
+    """
+    start, end = frame_range
+    video = mp_edit.VideoFileClip(video_path, audio=False)
+    detector = FaceDetector(proxy_width)
+    scheduler = DetectionScheduler(**scheduler_options)
+    track = FaceTrack(end - start, fps, video.h, video.w)
+
+    try:
+        for i in range(start, end):
+            frame = video.get_frame(clip_start + i / fps)
+            if scheduler.should_detect(i, frame):
+                track.record(i - start, detector.detect(frame))
+            if scheduler.at_cut:
+                track.shot_starts[i - start] = True
+    finally:
+        detector.close()
+        video.close()
+
+    return track.detected, track.counts, track.boxes, track.shot_starts
+
+
+def render_shard(video_path, clip_start, fps, frame_range, modes, crops, has_crop, watermark_height, output_path):
+    """Render one frame range of a planned clip into its own video-only part"""
+    start, end = frame_range
+    video = mp_edit.VideoFileClip(video_path, audio=False)
+    watermark = get_watermark(watermark_height) if watermark_height else None
+    renderer = FrameRenderer(watermark=watermark)
+    writer = FFMPEG_VideoWriter(
+        output_path,
+        (renderer.target_width, renderer.target_height),
+        fps,
+        codec='libx264',
+        preset=SHARD_PRESET,
+        threads=1,
+        ffmpeg_params=SHARD_FFMPEG_PARAMS
+    )
+
+    try:
+        for i in range(start, end):
+            frame = video.get_frame(clip_start + i / fps)
+            crop_box = tuple(int(v) for v in crops[i - start]) if has_crop[i - start] else None
+            writer.write_frame(renderer.render(frame, modes[i - start], crop_box))
+    finally:
+        writer.close()
+        video.close()
+
+    return output_path
+
+
+def concat_parts(part_paths, output_path):
+    """Join encoded parts with the concat demuxer, without re-encoding"""
+    list_path = output_path + '.txt'
+    with open(list_path, 'w') as f:
+        for path in part_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path],
+        capture_output=True,
+        text=True
+    )
+    os.remove(list_path)
+    if result.returncode != 0:
+        raise Exception(f"Failed to concatenate shard parts: {result.stderr[-500:]}")
+    return output_path
@@ -0,0 +1,187 @@
+import json
+import os
+import subprocess
+
+from clip_encoder import probe_audio_codec, MP4_AUDIO_CODECS
+
+# Video codecs whose partial GOPs we can re-encode to match the copied ones
+SMART_CUT_CODECS = {'h264'}
+
+# The re-encoded edges are at most a GOP long, so they are written near-lossless
+EDGE_PRESET = 'veryfast'
+EDGE_CRF = '16'
+
+
+# ffprobe's H.264 profile names and the matching libx264 -profile:v values
+X264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+    'High 10': 'high10',
+    'High 4:2:2': 'high422',
+    'High 4:4:4 Predictive': 'high444',
+}
+
+# The edges are written with their own parameter set IDs so they can never be
+# mistaken for the source's parameter sets, which are carried in-band with the
+# copied GOPs
+EDGE_PARAMETER_SET_ID = 1
+
+# Packet times are rounded to microseconds, so edges are decoded from this much
+# earlier (far less than a frame) to keep a frame whose rounded time is late
+SEEK_TOLERANCE = 0.001
+
+
+def probe_video_stream(path):
+    """codec_name, profile, level, width, height and pix_fmt of the first video stream, or None"""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=codec_name,profile,level,width,height,pix_fmt", "-of", "json", path],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        return None
+    streams = json.loads(result.stdout).get('streams', [])
+    return streams[0] if streams else None
+
+
+def video_packets(path, start, end):
+    """(pts_time, is_keyframe) of the video packets between start and end, read without decoding"""
+    # Read a little past end: packets come in decode order, so frames shown before
+    # end can follow a packet shown after it
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-read_intervals", f"{start}%{end + 1}",
+         "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"Failed to read keyframes of {path}: {result.stderr[-500:]}")
+
+    packets = []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(',')
+        if len(fields) >= 2 and fields[0] not in ('', 'N/A'):
+            pts_time = float(fields[0])
+            if start <= pts_time <= end:
+                packets.append((pts_time, 'K' in fields[1]))
+    return sorted(packets)
+
+
+def keyframe_times(path, start, end):
+    """Timestamps of the video keyframes between start and end, read from packet flags without decoding"""
+    return [pts_time for pts_time, is_keyframe in video_packets(path, start, end) if is_keyframe]
+
+
+def can_smart_cut(path):
+    stream = probe_video_stream(path)
+    return stream is not None and stream.get('codec_name') in SMART_CUT_CODECS
+
+
+def _run(command, description):
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Failed to {description}: {result.stderr[-500:]}")
+
+
+def _encode_part(source_path, start, frame_count, output_path, stream):
+    """Re-encode frame_count frames from start with the source's profile, level and pixel format, parameter sets in-band.
+
+    Bounded by frame count like _copy_part: a duration from rounded packet
+    times can take in the keyframe the next part starts with.
+    """
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-ss", str(max(0, start - SEEK_TOLERANCE)), "-i", source_path,
+               "-map", "0:v:0", "-an", "-frames:v", str(frame_count),
+               "-c:v", "libx264", "-preset", EDGE_PRESET, "-crf", EDGE_CRF,
+               "-pix_fmt", stream.get('pix_fmt') or 'yuv420p',
+               "-x264-params", f"sps-id={EDGE_PARAMETER_SET_ID}:repeat-headers=1"]
+    profile = X264_PROFILES.get(stream.get('profile'))
+    if profile:
+        command += ["-profile:v", profile]
+    if stream.get('level') and int(stream['level']) > 0:
+        command += ["-level:v", f"{int(stream['level']) / 10:.1f}"]
+    _run(command + ["-f", "matroska", output_path], "re-encode cut edge")
+
+
+def _copy_part(source_path, start, frame_count, output_path):
+    """Copy frame_count frames of whole GOPs from the keyframe at start.
+
+    The packets go through h264_mp4toannexb, which puts the source's SPS/PPS
+    in front of every keyframe. The copy is bounded by frame count rather than
+    duration: packets are in decode order, so a duration limit lets the next
+    keyframe and its leading frames through.
+    """
+    _run(["ffmpeg", "-y", "-loglevel", "error", "-ss", str(start), "-i", source_path,
+          "-map", "0:v:0", "-an", "-c:v", "copy", "-frames:v", str(frame_count),
+          "-bsf:v", "h264_mp4toannexb", "-f", "matroska", output_path],
+         "copy cut middle")
+
+
+def smart_cut(source_path, start, end, output_path, work_dir):
+    """Cut start..end frame-accurately, re-encoding only the partial GOPs at either edge.
+
+    The GOPs wholly inside the range are stream-copied; the frames before the
+    first and after the last keyframe are re-encoded, and the video parts are
+    concatenated.
+
+    Every part carries its parameter sets in-band, in front of each keyframe,
+    and the edges are encoded with the source's profile and level but their
+    own SPS/PPS IDs. After joining, the copied GOPs are therefore decoded with
+    the source's SPS/PPS rather than the edge encoder's, which are the ones in
+    the MP4's avcC. The audio is taken from the source for the exact range and
+    muxed with the joined video (copied when the codec allows). The source's
+    video codec must be in SMART_CUT_CODECS.
+    """
+    stream = probe_video_stream(source_path) or {}
+    packets = video_packets(source_path, start, end)
+    keyframes = [pts_time for pts_time, is_keyframe in packets if is_keyframe]
+    extension = '.mkv'
+    base = os.path.join(work_dir, os.path.splitext(os.path.basename(output_path))[0])
+
+    parts = []
+    if len(keyframes) < 2:
+        # No whole GOP inside the range: re-encode all of it
+        parts.append(('encode', start, end))
+    else:
+        first, last = keyframes[0], keyframes[-1]
+        if first > start:
+            parts.append(('encode', start, first))
+        parts.append(('copy', first, last))
+        if end > last:
+            parts.append(('encode', last, end))
+
+    part_paths = []
+    for n, (kind, part_start, part_end) in enumerate(parts):
+        part_path = f"{base}_part{n}{extension}"
+        # Every part holds the frames shown in [part_start, part_end), so none is in two parts
+        frame_count = sum(1 for pts_time, _ in packets if part_start <= pts_time < part_end)
+        if frame_count == 0:
+            continue
+        if kind == 'encode':
+            _encode_part(source_path, part_start, frame_count, part_path, stream)
+        else:
+            _copy_part(source_path, part_start, frame_count, part_path)
+        part_paths.append(part_path)
+
+    list_path = f"{base}_parts.txt"
+    with open(list_path, 'w') as f:
+        for path in part_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    audio_codec = ["copy"] if probe_audio_codec(source_path) in MP4_AUDIO_CODECS else ["aac", "-b:a", "192k"]
+    try:
+        _run(["ffmpeg", "-y", "-loglevel", "error",
+              "-f", "concat", "-safe", "0", "-i", list_path,
+              "-ss", str(start), "-t", str(end - start), "-i", source_path,
+              "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy", "-c:a", *audio_codec,
+              "-t", str(end - start), output_path],
+             "join smart cut parts")
+    finally:
+        for path in part_paths + [list_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    return output_path
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from cache_utils import CacheStats, locked, temporary_path, touch, lru_victims
+
+# Matches the 11-character video ID in the usual YouTube URL forms
+YOUTUBE_ID_PATTERN = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})')
+
+# Entries used this recently are never evicted, since a job may still be reading them
+MIN_IDLE_SECONDS = 3600
+
+
+def normalize_source(source):
+    """A stable identity for a source URL: the YouTube video ID, or the URL without its fragment"""
+    match = YOUTUBE_ID_PATTERN.search(source)
+    if match:
+        return f"youtube:{match.group(1)}"
+    return source.split('#')[0].strip()
+
+
+class SourceCache:
+    """Downloaded source videos shared by every worker through cache_dir (EFS in production).
+
+    Entries are content-addressed directories holding the media file and a
+    meta.json, written to a temporary name and renamed into place, so readers
+    never see a partial entry. A per-key lock lets one worker download while
+    the others wait and then hit. Entries over max_bytes are evicted least
+    recently used first.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.entries_dir = os.path.join(self.cache_dir, 'sources')
+        self.locks_dir = os.path.join(self.cache_dir, 'locks')
+        self.max_bytes = max_bytes
+        self.stats = CacheStats('Source')
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    def key(self, source, format_selector, quality, section=None):
+        identity = '|'.join([normalize_source(source), format_selector, str(quality), section or 'full'])
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def lock(self, key):
+        """Held around lookup and download so a source is only downloaded once at a time"""
+        return locked(os.path.join(self.locks_dir, f"{key}.lock"))
+
+    def lookup(self, key):
+        """The cached entry's {'path', 'title', 'size'}, or None on a miss"""
+        entry_dir = os.path.join(self.entries_dir, key)
+        try:
+            with open(os.path.join(entry_dir, 'meta.json')) as f:
+                meta = json.load(f)
+            path = os.path.join(entry_dir, meta['filename'])
+        except (OSError, ValueError, KeyError):
+            path = None
+
+        if path is None or not os.path.exists(path):
+            self.stats.record_miss()
+            print(self.stats.summary())
+            return None
+
+        touch(entry_dir)
+        self.stats.record_hit(meta['size'])
+        print(self.stats.summary())
+        return {'path': path, 'title': meta['title'], 'size': meta['size']}
+
+    def store(self, key, source_path, title):
+        """Add a downloaded file to the cache; the file at source_path is left in place"""
+        filename = os.path.basename(source_path)
+        temp_dir = temporary_path(self.entries_dir)
+        os.makedirs(temp_dir)
+        try:
+            cached_path = os.path.join(temp_dir, filename)
+            try:
+                os.link(source_path, cached_path)
+            except OSError:
+                # Different filesystem (local disk to EFS)
+                shutil.copyfile(source_path, cached_path)
+
+            size = os.path.getsize(cached_path)
+            with open(os.path.join(temp_dir, 'meta.json'), 'w') as f:
+                json.dump({'filename': filename, 'title': title, 'size': size}, f)
+
+            entry_dir = os.path.join(self.entries_dir, key)
+            try:
+                os.rename(temp_dir, entry_dir)
+            except OSError:
+                # Another worker stored the same entry first
+                pass
+        finally:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self.evict()
+
+    def materialize(self, entry, destination_dir):
+        """A job's own copy of a cached file in destination_dir.
+
+        Hard-linked when the cache is on the same filesystem, otherwise copied
+        (local disk from EFS). The job writes its cuts and temporary files next
+        to the returned path and deletes it, so it is never the cached file.
+        """
+        destination = os.path.join(destination_dir, os.path.basename(entry['path']))
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(entry['path'], destination)
+        except OSError:
+            shutil.copyfile(entry['path'], destination)
+        return destination
+
+    def evict(self):
+        entries = []
+        for key in os.listdir(self.entries_dir):
+            entry_dir = os.path.join(self.entries_dir, key)
+            if key.startswith('.tmp-') or not os.path.isdir(entry_dir):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+                entries.append((entry_dir, size, os.path.getmtime(entry_dir)))
+            except OSError:
+                continue
+
+        victims = lru_victims(entries, self.max_bytes, MIN_IDLE_SECONDS)
+        for entry_dir in victims:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        if victims:
+            self.stats.record_evictions(len(victims))
+            print(f"Evicted {len(victims)} cached sources")
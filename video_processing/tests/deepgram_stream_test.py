@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import tracemalloc
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from deepgram import (
+    DeepgramClient,
+    DeepgramClientOptions,
+    PrerecordedOptions,
+    FileSource,
+)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ffmpeg_jobs import FfmpegJobPlan, ASR_AUDIO_EXTENSION
+
+# Compares the old transcription upload (full-quality mp3 read into memory) with the
+# ASR audio profile streamed from disk, against a local stand-in for the Deepgram API
+VIDEO_FILE = "./downloads/sample_podcast.mp4"
+CLIP_START = 0
+CLIP_END = 600
+
+# Simulated uplink to Deepgram, in bytes per second
+UPLINK_BYTES_PER_SECOND = 4 * 1024 * 1024
+
+STUB_RESPONSE = {
+    "metadata": {"request_id": "stand-in", "created": "2024-01-01T00:00:00Z", "duration": 1.0, "channels": 1},
+    "results": {"channels": [{"alternatives": [{
+        "transcript": "hello world",
+        "confidence": 1.0,
+        "words": [
+            {"word": "hello", "start": 0.08, "end": 0.4, "confidence": 1.0, "punctuated_word": "Hello"},
+            {"word": "world", "start": 0.48, "end": 0.9, "confidence": 1.0, "punctuated_word": "world."}
+        ]
+    }]}]}
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Reads the upload at UPLINK_BYTES_PER_SECOND and answers like /v1/listen"""
+    received = []
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        remaining = length
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 64 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            time.sleep(len(chunk) / UPLINK_BYTES_PER_SECOND)
+        StandInHandler.received.append(length - remaining)
+
+        body = json.dumps(STUB_RESPONSE).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def transcribe(client, audio_path, stream):
+    """Upload time and peak Python memory of one transcription request"""
+    options = PrerecordedOptions(model="nova-2", smart_format=True)
+    tracemalloc.start()
+    tick = time.time()
+    with open(audio_path, "rb") as file:
+        if stream:
+            payload: FileSource = {"stream": file}
+        else:
+            payload: FileSource = {"buffer": file.read()}
+        response = client.listen.prerecorded.v("1").transcribe_file(payload, options)
+    elapsed = time.time() - tick
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert response.results.channels[0].alternatives[0].words[0].word == "hello"
+    return elapsed, peak
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = DeepgramClient("stand-in-key", DeepgramClientOptions(url=f"http://127.0.0.1:{server.server_port}"))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        mp3_path = os.path.join(work_dir, "audio.mp3")
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-ss", str(CLIP_START), "-t", str(CLIP_END - CLIP_START),
+                        "-i", VIDEO_FILE, "-map", "0:a", "-q:a", "0", mp3_path], check=True)
+        asr_path = os.path.join(work_dir, f"audio{ASR_AUDIO_EXTENSION}")
+        FfmpegJobPlan(VIDEO_FILE).add(CLIP_START, CLIP_END, audio_path=asr_path).run()
+
+        results = {}
+        for name, path, stream in [("mp3 buffer", mp3_path, False), ("asr stream", asr_path, True)]:
+            elapsed, peak = transcribe(client, path, stream)
+            size = os.path.getsize(path)
+            assert StandInHandler.received[-1] == size, "Stand-in did not receive the whole file"
+            results[name] = (size, elapsed, peak)
+            print(f"{name}: {size / 1024 / 1024:.1f} MB uploaded in {elapsed:.2f}s, "
+                  f"peak memory {peak / 1024 / 1024:.1f} MB")
+
+    old, new = results["mp3 buffer"], results["asr stream"]
+    print(f"Upload {old[1] / new[1]:.1f}x faster, peak memory {old[2] / max(new[2], 1):.1f}x lower")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+import tempfile
+import moviepy.editor as mp_edit
+from dotenv import load_dotenv, find_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clip_encoder import encode_clip
+from encoding_profiles import ENCODING_PROFILES, encoding_options
+
+load_dotenv(find_dotenv())
+
+# Local clip encoded once per profile through the pipe encoder used for final clips
+VIDEO_FILE = "./downloads/sample_podcast.mp4"
+CLIP_START = 0
+CLIP_END = 30
+
+
+def main():
+    clip = mp_edit.VideoFileClip(VIDEO_FILE).subclip(CLIP_START, CLIP_END)
+    frame_count = int(clip.duration * clip.fps)
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        print(f"{'profile':<10} {'fps':>8} {'seconds':>8} {'size MB':>8}")
+        for name in ENCODING_PROFILES:
+            output_path = os.path.join(output_folder, f"{name}.mp4")
+
+            tick = time.time()
+            encode_clip(clip, output_path, encoding_options(name), (VIDEO_FILE, CLIP_START, CLIP_END))
+            elapsed = time.time() - tick
+
+            size_mb = os.path.getsize(output_path) / (1024 * 1024)
+            print(f"{name:<10} {frame_count / elapsed:>8.1f} {elapsed:>8.2f} {size_mb:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
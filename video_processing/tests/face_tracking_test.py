@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import moviepy.editor as mp_edit
+from dotenv import load_dotenv, find_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import VideoProcessor
+from face_tracking import INTERPOLATION_TOLERANCE
+
+load_dotenv(find_dotenv())
+
+# Local talking-head clip to compare strided detection against per-frame detection
+VIDEO_FILE = "./downloads/sample_podcast.mp4"
+CLIP_START = 0
+CLIP_END = 60
+
+
+def main():
+    processor = VideoProcessor()
+    clip = mp_edit.VideoFileClip(VIDEO_FILE).subclip(CLIP_START, CLIP_END)
+
+    tick = time.time()
+    full_track = processor.build_face_track(clip, stride=1)
+    full_time = time.time() - tick
+
+    tick = time.time()
+    strided_track = processor.build_face_track(clip)
+    strided_time = time.time() - tick
+
+    deviation = strided_track.max_box_deviation(full_track)
+    tolerance = INTERPOLATION_TOLERANCE * full_track.frame_width
+    detections = int(strided_track.detected.sum())
+
+    print(f"Per-frame detection: {full_track.frame_count} detections in {full_time:.2f}s")
+    stride = processor.face_scheduler_options()["stride"]
+    print(f"Strided detection (stride {stride}): {detections} detections in {strided_time:.2f}s")
+    print(f"Max box deviation: {deviation}px (tolerance {tolerance:.0f}px)")
+
+    assert deviation <= tolerance, "Strided detection drifted beyond tolerance"
+
+
+if __name__ == "__main__":
+    main()
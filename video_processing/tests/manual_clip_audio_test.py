@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import subprocess
+import numpy as np
+from dotenv import load_dotenv, find_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import VideoProcessor
+from transcription import probe_duration
+
+load_dotenv(find_dotenv())
+
+# A VP9/Opus webm with a keyframe every 4 seconds, so a stream-copied cut from
+# CLIP_START starts 3 seconds early. Its audio is a chirp whose frequency gives
+# the source time: 200 + 50 * t Hz.
+GOP_SECONDS = 4
+CLIP_START = 7
+CLIP_END = 20
+SAMPLE_RATE = 16000
+
+
+def make_source(path):
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error",
+         "-f", "lavfi", "-i", "testsrc=size=320x180:rate=25:duration=30",
+         "-f", "lavfi", "-i", "aevalsrc=sin(2*PI*(200*t+25*t*t)):s=48000:d=30",
+         "-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8", "-g", str(GOP_SECONDS * 25),
+         "-c:a", "libopus", path],
+        check=True
+    )
+
+
+def source_time_at(audio_path, offset, window=0.25):
+    """Source time of the chirp at offset seconds into audio_path, from its dominant frequency"""
+    samples = np.frombuffer(subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-ss", str(offset), "-t", str(window), "-i", audio_path,
+         "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"],
+        capture_output=True, check=True
+    ).stdout, dtype=np.int16).astype(float)
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    frequency = np.argmax(spectrum) * SAMPLE_RATE / len(samples)
+    return (frequency - 200) / 50 - window / 2
+
+
+def main():
+    processor = VideoProcessor()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "source.webm")
+        make_source(source_path)
+
+        clip_path = processor.cut_clips(source_path, [(CLIP_START, CLIP_END)])[0]
+        audio_path = processor.asr_audio_path(clip_path)
+
+        # Manual clips are rendered from the source at CLIP_START with captions from 0,
+        # so their transcript audio must start there, not at the cut's keyframe
+        duration = probe_duration(audio_path)
+        start = source_time_at(audio_path, 0.5) - 0.5
+        print(f"Clip video: {probe_duration(clip_path):.2f}s, ASR audio: {duration:.2f}s starting at {start:.2f}s")
+        assert abs(duration - (CLIP_END - CLIP_START)) < 0.1, "ASR audio does not cover the exact clip range"
+        assert abs(start - CLIP_START) < 0.2, "ASR audio does not start at the clip start"
+
+    print("Manual clip audio test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+from dotenv import load_dotenv, find_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import VideoProcessor
+from clip_encoder import probe_audio_codec, MP4_AUDIO_CODECS
+
+load_dotenv(find_dotenv())
+
+# Local clip with AAC audio, rendered through the pre-cut path with the pipe encoder
+VIDEO_FILE = "./downloads/sample_podcast.mp4"
+SEGMENT_START = 5
+SEGMENT_END = 15
+
+
+def audio_packets(path):
+    """The first audio stream's packets, copied without decoding"""
+    command = ["ffmpeg", "-loglevel", "error", "-i", path, "-map", "0:a:0", "-c", "copy", "-f", "data", "-"]
+    return subprocess.run(command, capture_output=True, check=True).stdout
+
+
+def main():
+    processor = VideoProcessor()
+    processor.CLIP_ENCODER = 'pipe'
+    assert processor.PRECUT_SEGMENTS, "Pre-cut segments should be on by default"
+    assert probe_audio_codec(VIDEO_FILE) in MP4_AUDIO_CODECS, "Test source needs MP4-compatible audio"
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        video_path = os.path.join(work_dir, os.path.basename(VIDEO_FILE))
+        shutil.copy(VIDEO_FILE, video_path)
+        segment = {'title': 'precut audio', 'start': SEGMENT_START, 'end': SEGMENT_END,
+                   'transcript': '', 'word_timings': []}
+        processor.precut_segments(video_path, [segment])
+        print(f"Pre-cut audio codec: {probe_audio_codec(segment['source_path'])}")
+
+        output_folder = os.path.join(work_dir, "clips")
+        os.makedirs(output_folder)
+        processor.render_segment(video_path, segment, 'landscape', 'no_captions', output_folder,
+                                 None, None, 'test', 'test', True, False, 'auto', None)
+        clip_path = os.path.join(output_folder, os.listdir(output_folder)[0])
+
+        # Passthrough: the clip's audio packets are the source's own, not a transcode of the pre-cut PCM
+        clip_codec = probe_audio_codec(clip_path)
+        print(f"Clip audio codec: {clip_codec}")
+        assert clip_codec == probe_audio_codec(VIDEO_FILE), "Clip audio was transcoded"
+        clip_audio = audio_packets(clip_path)
+        assert clip_audio and clip_audio in audio_packets(video_path), "Clip audio is not a run of the source's packets"
+
+    print("Pre-cut audio passthrough test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import tempfile
+import boto3
+import moviepy.editor as mp_edit
+from dotenv import load_dotenv, find_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clip_encoder import encode_clip
+from encoding_profiles import encoding_options
+from s3_stream import S3MultipartSink
+from main import VideoProcessor
+
+load_dotenv(find_dotenv())
+
+# Run against a local S3-compatible store, e.g.
+#   docker run -p 9000:9000 minio/minio server /data
+#   S3_ENDPOINT_URL=http://localhost:9000 AWS_ACCESS_KEY_ID=minioadmin AWS_SECRET_ACCESS_KEY=minioadmin
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'http://localhost:9000')
+TEST_BUCKET = os.environ.get('S3_TEST_BUCKET', 'lunaris-stream-test')
+
+VIDEO_FILE = "./downloads/sample_podcast.mp4"
+CLIP_START = 0
+CLIP_END = 30
+
+
+def main():
+    s3_client = boto3.client('s3',
+        aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
+        region_name=os.environ.get('AWS_REGION', 'us-east-1'),
+        endpoint_url=S3_ENDPOINT_URL
+    )
+    existing = [bucket['Name'] for bucket in s3_client.list_buckets().get('Buckets', [])]
+    if TEST_BUCKET not in existing:
+        s3_client.create_bucket(Bucket=TEST_BUCKET)
+
+    clip = mp_edit.VideoFileClip(VIDEO_FILE).subclip(CLIP_START, CLIP_END)
+    key = "stream_test/clip.mp4"
+
+    # Small parts so even a short clip is uploaded in several of them
+    sink = S3MultipartSink(s3_client, TEST_BUCKET, key, part_size=5 * 1024 * 1024, max_pending=2)
+    tick = time.time()
+    stats = encode_clip(clip, key, encoding_options('premium'), (VIDEO_FILE, CLIP_START, CLIP_END), sink=sink)
+    print(f"Streamed {stats['frames']} frames, {sink.bytes_written} bytes in {time.time() - tick:.2f}s "
+          f"({stats['backpressure']:.0%} backpressure)")
+
+    head = s3_client.head_object(Bucket=TEST_BUCKET, Key=key)
+    assert head['ContentLength'] == sink.bytes_written, "Uploaded size does not match the encoded output"
+
+    # The uploaded object must be a playable clip of the same length
+    with tempfile.TemporaryDirectory() as download_folder:
+        local_path = os.path.join(download_folder, "clip.mp4")
+        s3_client.download_file(TEST_BUCKET, key, local_path)
+        uploaded = mp_edit.VideoFileClip(local_path)
+        print(f"Uploaded clip: {uploaded.duration:.2f}s, {uploaded.size}, audio: {uploaded.audio is not None}")
+        assert abs(uploaded.duration - clip.duration) < 0.1, "Uploaded clip duration differs"
+        uploaded.close()
+
+    # A failed encode must not leave a multipart upload behind
+    sink = S3MultipartSink(s3_client, TEST_BUCKET, "stream_test/aborted.mp4")
+    sink.write(b"partial")
+    sink.abort()
+    uploads = s3_client.list_multipart_uploads(Bucket=TEST_BUCKET).get('Uploads', [])
+    assert not [upload for upload in uploads if upload['UploadId'] == sink.upload_id], "Aborted upload left behind"
+
+    # Nor may an encoder that fails to start (here on options without a codec)
+    processor = VideoProcessor()
+    try:
+        processor.stream_upload_clip(clip, "failed.mp4", {}, (VIDEO_FILE, CLIP_START, CLIP_END),
+                                     s3_client, TEST_BUCKET, "stream_test", "failed")
+        raise AssertionError("Encoder without options started")
+    except KeyError:
+        pass
+    uploads = s3_client.list_multipart_uploads(Bucket=TEST_BUCKET).get('Uploads', [])
+    assert not [upload for upload in uploads if upload['Key'] == "stream_test/failed/failed.mp4"], \
+        "Upload left behind by an encoder that failed to start"
+
+    s3_client.delete_object(Bucket=TEST_BUCKET, Key=key)
+    print("Streaming upload test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from word_alignment import WordAlignmentIndex
+
+# A synthetic 3-hour transcript (about 30k words) with punctuation like smart_format output
+WORD_COUNT = 30000
+SEGMENT_COUNT = 15
+SEGMENT_WORDS = 120
+
+VOCABULARY = ["so", "i", "think", "the", "most", "important", "thing", "is", "to", "focus", "on", "what",
+              "matters", "and", "not", "get", "distracted", "by", "all", "noise", "around", "you", "that's",
+              "really", "makes", "difference", "we", "were", "building", "company", "when", "it", "happened"]
+
+
+def make_transcript(rng):
+    word_timings = []
+    for i in range(WORD_COUNT):
+        word = rng.choice(VOCABULARY)
+        if rng.random() < 0.08:
+            word += rng.choice([",", ".", "?"])
+        word_timings.append({'start': i * 0.36, 'end': i * 0.36 + 0.3, 'word': word})
+    return word_timings
+
+
+def scan_locate(word_timings, text):
+    """The linear scan the index replaces: exact first/last 10-word matches at every position"""
+    words = text.lower().split()
+    start_index = None
+    for i in range(len(word_timings)):
+        if [wt['word'] for wt in word_timings[i:i+10]] == words[:10]:
+            start_index = i
+        if [wt['word'] for wt in word_timings[i:i+10]] == words[-10:]:
+            return (start_index, i + 9) if start_index is not None else None
+    return None
+
+
+def llm_text(word_timings, first, last):
+    """Segment text as the LLM returns it: lowercase, punctuation and apostrophes dropped"""
+    return ' '.join(timing['word'].strip(',.?').replace("'", "") for timing in word_timings[first:last + 1])
+
+
+def main():
+    rng = random.Random(7)
+    word_timings = make_transcript(rng)
+    spans = [(first, first + SEGMENT_WORDS - 1)
+             for first in rng.sample(range(WORD_COUNT - SEGMENT_WORDS), SEGMENT_COUNT)]
+    exact_texts = [' '.join(timing['word'] for timing in word_timings[first:last + 1]) for first, last in spans]
+    llm_texts = [llm_text(word_timings, first, last) for first, last in spans]
+
+    tick = time.time()
+    scanned = [scan_locate(word_timings, text) for text in exact_texts]
+    scan_seconds = time.time() - tick
+
+    tick = time.time()
+    index = WordAlignmentIndex(word_timings)
+    build_seconds = time.time() - tick
+    tick = time.time()
+    located = [index.locate(text) for text in exact_texts]
+    lookup_seconds = time.time() - tick
+
+    assert located == spans, "Index found different spans than the segments' positions"
+    assert all(span == expected for span, expected in zip(scanned, spans) if span), "Scan disagrees with the index"
+    print(f"Linear scan: {scan_seconds:.3f}s for {SEGMENT_COUNT} segments")
+    print(f"Index: {build_seconds:.3f}s to build, {lookup_seconds * 1000:.2f}ms for {SEGMENT_COUNT} segments")
+
+    scan_found = sum(scan_locate(word_timings, text) is not None for text in llm_texts)
+    index_found = [index.locate(text) for text in llm_texts]
+    assert index_found == spans, "Normalized lookup found different spans"
+    print(f"LLM-formatted text located: scan {scan_found}/{SEGMENT_COUNT}, index {SEGMENT_COUNT}/{SEGMENT_COUNT}")
+
+    # A changed word at each edge falls back to the shorter anchors
+    first, last = spans[0]
+    words = llm_texts[0].split()
+    words[0], words[-1] = "um", "right"
+    assert index.locate(' '.join(words)) == (first, last), "Fuzzy anchors did not recover the segment"
+    print("Word alignment benchmark passed")
+
+
+if __name__ == "__main__":
+    main()
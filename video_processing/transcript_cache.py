@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+import json
+import os
+
+from cache_utils import CacheStats, atomic_write_bytes, touch, lru_victims
+
+# Bumped when the stored layout changes, so old entries are simply missed
+FORMAT_VERSION = 1
+
+# Entries used this recently are never evicted
+MIN_IDLE_SECONDS = 600
+
+
+def hash_audio(audio_path, options):
+    """blake2b of the audio file's bytes and the transcription options"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps({'version': FORMAT_VERSION, 'options': options}, sort_keys=True).encode())
+    with open(audio_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_transcript(words, word_timings):
+    """Columnar, gzipped form of a transcript.
+
+    words are the words as returned by the ASR; times are stored as
+    millisecond deltas, which compress far better than a list of dicts.
+    """
+    starts = [round(timing['start'] * 1000) for timing in word_timings]
+    ends = [round(timing['end'] * 1000) for timing in word_timings]
+    columns = {
+        'words': words,
+        # Start of each word relative to the previous start
+        'starts': [start - previous for start, previous in zip(starts, [0] + starts[:-1])],
+        # Length of each word
+        'durations': [end - start for start, end in zip(starts, ends)],
+    }
+    return gzip.compress(json.dumps(columns, separators=(',', ':')).encode(), compresslevel=6)
+
+
+def decode_transcript(data):
+    """(full_transcript, word_timings) as returned by VideoProcessor.transcribe_audio"""
+    columns = json.loads(gzip.decompress(data))
+    word_timings = []
+    start = 0
+    for word, delta, duration in zip(columns['words'], columns['starts'], columns['durations']):
+        start += delta
+        word_timings.append({
+            'start': start / 1000,
+            'end': (start + duration) / 1000,
+            'word': word.strip().lower()
+        })
+    full_transcript = ' '.join(columns['words']).strip()
+    return full_transcript, word_timings
+
+
+class TranscriptCache:
+    """Transcripts keyed by the content of the audio they came from.
+
+    A retried job, a redelivered message or a new project on the same cut
+    extracts the same audio, and the bitexact Ogg output (ASR_AUDIO_ARGS)
+    makes it the same bytes on the same ffmpeg build, so its transcript is
+    served from disk instead of calling the ASR again. Entries are single
+    gzipped files written atomically; the cache is trimmed to max_bytes least
+    recently used first.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.entries_dir = os.path.join(os.path.abspath(cache_dir), 'transcripts')
+        self.max_bytes = max_bytes
+        self.stats = CacheStats('Transcript')
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.entries_dir, f"{key}.json.gz")
+
+    def lookup(self, key):
+        """(full_transcript, word_timings), or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            result = decode_transcript(data)
+        except (OSError, ValueError, KeyError, EOFError):
+            self.stats.record_miss()
+            print(self.stats.summary())
+            return None
+
+        touch(path)
+        self.stats.record_hit(len(data))
+        print(self.stats.summary())
+        return result
+
+    def store(self, key, words, word_timings):
+        atomic_write_bytes(self._path(key), encode_transcript(words, word_timings))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.entries_dir):
+            if not name.endswith('.json.gz'):
+                continue
+            path = os.path.join(self.entries_dir, name)
+            try:
+                entries.append((path, os.path.getsize(path), os.path.getmtime(path)))
+            except OSError:
+                continue
+
+        victims = lru_victims(entries, self.max_bytes, MIN_IDLE_SECONDS)
+        for path in victims:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if victims:
+            self.stats.record_evictions(len(victims))
+            print(f"Evicted {len(victims)} cached transcripts")
@@ -0,0 +1,188 @@
+import csv
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from deepgram import FileSource, PrerecordedOptions
+
+# HTTP statuses worth retrying: rate limiting and server-side failures
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Pauses at least this long and this quiet are candidate split points
+SILENCE_NOISE = "-35dB"
+SILENCE_MIN_SECONDS = 0.3
+
+SILENCE_PATTERN = re.compile(r'silence_(start|end): (-?[\d.]+)')
+
+
+def is_retryable(error):
+    """Whether a failed request may succeed when sent again"""
+    if isinstance(error, httpx.TransportError):
+        # Connection failures and timeouts
+        return True
+    try:
+        return int(getattr(error, 'status', 0)) in RETRYABLE_STATUSES
+    except (TypeError, ValueError):
+        return False
+
+
+def probe_duration(path):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"Failed to probe {path}: {result.stderr[-500:]}")
+    return float(result.stdout.strip())
+
+
+def detect_silences(audio_path):
+    """(start, end) of every pause in the audio, from ffmpeg's silencedetect"""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", audio_path,
+         "-af", f"silencedetect=noise={SILENCE_NOISE}:d={SILENCE_MIN_SECONDS}", "-f", "null", "-"],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"Failed to detect silences in {audio_path}: {result.stderr[-500:]}")
+
+    silences, start = [], None
+    for kind, value in SILENCE_PATTERN.findall(result.stderr):
+        if kind == 'start':
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+
+def choose_split_points(silences, duration, chunk_seconds):
+    """Split times roughly chunk_seconds apart, each moved to the middle of the nearest pause.
+
+    A pause is used if it lies within a quarter chunk of the target; otherwise
+    the audio is split at the target itself.
+    """
+    points = []
+    last = 0.0
+    window = chunk_seconds * 0.25
+    while duration - last > chunk_seconds + window:
+        target = last + chunk_seconds
+        candidates = [(start + end) / 2 for start, end in silences if abs((start + end) / 2 - target) <= window]
+        point = min(candidates, key=lambda middle: abs(middle - target)) if candidates else target
+        points.append(point)
+        last = point
+    return points
+
+
+def split_audio(audio_path, split_points, work_dir):
+    """Stream-copy the audio into one file per chunk; returns (path, offset) pairs.
+
+    Each chunk's timestamps start from zero; offsets come from the segment
+    muxer's own list, so they are the exact packet times each chunk starts at
+    rather than the requested split times.
+    """
+    extension = os.path.splitext(audio_path)[1]
+    list_path = os.path.join(work_dir, "chunks.csv")
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", audio_path, "-map", "0:a", "-c", "copy",
+         "-f", "segment", "-segment_times", ",".join(f"{point:.3f}" for point in split_points),
+         "-segment_list", list_path, "-segment_list_type", "csv", "-reset_timestamps", "1",
+         os.path.join(work_dir, f"chunk_%04d{extension}")],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"Failed to split {audio_path}: {result.stderr[-500:]}")
+
+    with open(list_path, newline='') as f:
+        return [(os.path.join(work_dir, row[0]), float(row[1])) for row in csv.reader(f) if row]
+
+
+def response_words(response, offset=0.0):
+    """(word, start, end) of every word in a Deepgram response, shifted by offset seconds"""
+    return [
+        (word.word, word.start + offset, word.end + offset)
+        for word in response.results.channels[0].alternatives[0].words
+    ]
+
+
+class TranscriptionClient:
+    """Deepgram prerecorded transcription shared by every job in the process.
+
+    Requests are network-bound and independent, so up to max_in_flight of them
+    run at once; further callers wait for a free slot. Each attempt gets its
+    own timeout, and timeouts, connection errors, 429s and 5xx responses are
+    retried with jittered exponential backoff.
+
+    Audio longer than long_audio_seconds is split at pauses into chunks of
+    about chunk_seconds, which are transcribed in parallel and retried one by
+    one, so latency is bounded by the slowest chunk rather than the whole file.
+    """
+
+    def __init__(self, deepgram_client, max_in_flight=4, timeout=300.0, max_retries=3, backoff=2.0,
+                 long_audio_seconds=1200, chunk_seconds=300):
+        self.deepgram_client = deepgram_client
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.long_audio_seconds = long_audio_seconds
+        self.chunk_seconds = chunk_seconds
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def transcribe_words(self, audio_path, transcription_options):
+        """(word, start, end) of every word in the audio, chunking long files"""
+        duration = probe_duration(audio_path)
+        if self.long_audio_seconds <= 0 or duration <= self.long_audio_seconds:
+            return response_words(self.transcribe_file(audio_path, transcription_options))
+
+        split_points = choose_split_points(detect_silences(audio_path), duration, self.chunk_seconds)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(audio_path))) as work_dir:
+            chunks = split_audio(audio_path, split_points, work_dir)
+            print(f"Transcribing {duration / 60:.0f} minutes of audio in {len(chunks)} chunks")
+
+            def transcribe_chunk(chunk):
+                chunk_path, offset = chunk
+                return response_words(self.transcribe_file(chunk_path, transcription_options), offset)
+
+            with ThreadPoolExecutor(max_workers=min(len(chunks), self.max_in_flight)) as executor:
+                # map keeps the chunks in order; a chunk that fails all its retries fails the transcription
+                chunk_words = list(executor.map(transcribe_chunk, chunks))
+
+        return [word for words in chunk_words for word in words]
+
+    def transcribe_file(self, audio_path, transcription_options):
+        """The Deepgram response for an audio file, streamed from disk"""
+        options = PrerecordedOptions(**transcription_options)
+
+        for attempt in range(self.max_retries):
+            tick = time.time()
+            with self._slots:
+                waited = time.time() - tick
+                if waited > 1:
+                    print(f"Waited {waited:.1f}s for a free transcription slot")
+                try:
+                    # Reopened on every attempt so a retry streams from the start
+                    with open(audio_path, "rb") as file:
+                        payload: FileSource = {
+                            "stream": file,
+                        }
+                        return self.deepgram_client.listen.prerecorded.v("1").transcribe_file(
+                            payload, options, timeout=httpx.Timeout(self.timeout, connect=10.0)
+                        )
+                except Exception as e:
+                    if not is_retryable(e) or attempt == self.max_retries - 1:
+                        raise
+                    print(f"Transcription attempt {attempt + 1} failed: {str(e)}")
+
+            delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"Retrying transcription in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
@@ -0,0 +1,97 @@
+import re
+from collections import defaultdict
+
+# Words compared to anchor a segment's first and last words in the transcript
+ANCHOR_WORDS = 10
+
+# Shorter anchors tried at nearby offsets when the full anchor does not match
+FUZZY_ANCHOR_WORDS = 5
+FUZZY_MAX_OFFSET = 5
+
+NON_WORD_PATTERN = re.compile(r"[^\w]+")
+
+
+def normalize_word(word):
+    """Lowercase without punctuation or apostrophes, so "That's," and "thats" compare equal"""
+    return NON_WORD_PATTERN.sub('', word.lower())
+
+
+class WordAlignmentIndex:
+    """Locates segment text returned by the LLM in the transcript's word_timings.
+
+    Built once per transcript: every run of ANCHOR_WORDS consecutive words is
+    hashed to the positions where it starts, both as transcribed and
+    normalized, so a segment's start and end are dictionary lookups instead
+    of a scan over the whole transcript. When the LLM's text deviates
+    slightly (punctuation, contractions, a changed word near an edge), shorter
+    normalized anchors a few words in are tried before giving up.
+    """
+
+    def __init__(self, word_timings):
+        self.word_timings = word_timings
+        self.words = [timing['word'] for timing in word_timings]
+        self.normalized = [normalize_word(word) for word in self.words]
+        self.exact = self._build(self.words, ANCHOR_WORDS)
+        self.fuzzy = self._build(self.normalized, ANCHOR_WORDS)
+        self.fuzzy_short = self._build(self.normalized, FUZZY_ANCHOR_WORDS)
+
+    @staticmethod
+    def _build(words, size):
+        positions = defaultdict(list)
+        for i in range(len(words) - size + 1):
+            positions[tuple(words[i:i + size])].append(i)
+        return positions
+
+    def locate(self, text):
+        """(first, last) word_timings indices of the text, or None if it cannot be found"""
+        words = text.lower().split()
+        if not words:
+            return None
+
+        span = self._match(self.exact, words, ANCHOR_WORDS)
+        if span is None:
+            normalized = [word for word in (normalize_word(word) for word in words) if word]
+            span = self._match(self.fuzzy, normalized, ANCHOR_WORDS) or self._match_fuzzy(normalized)
+        return span
+
+    def _match(self, index, words, size):
+        if len(words) < size:
+            return self._scan(words)
+        return self._span(index.get(tuple(words[:size]), []), index.get(tuple(words[-size:]), []), size)
+
+    def _match_fuzzy(self, words):
+        """Anchor on shorter runs up to FUZZY_MAX_OFFSET words in from either edge"""
+        size = FUZZY_ANCHOR_WORDS
+        if len(words) < size + 1:
+            return None
+
+        starts, ends = [], []
+        for offset in range(min(FUZZY_MAX_OFFSET, len(words) - size) + 1):
+            if not starts:
+                starts = [i - offset for i in self.fuzzy_short.get(tuple(words[offset:offset + size]), []) if i >= offset]
+            if not ends:
+                tail = words[len(words) - size - offset:len(words) - offset]
+                # Shifted so that, like an exact anchor, the end position plus size - 1 is the last word
+                ends = [i + offset for i in self.fuzzy_short.get(tuple(tail), [])
+                        if i + offset + size <= len(self.words)]
+        return self._span(starts, ends, size)
+
+    @staticmethod
+    def _span(starts, ends, size):
+        """The earliest end anchor with a start anchor at or before it, paired with the closest such start"""
+        for end in ends:
+            candidates = [start for start in starts if start <= end]
+            if candidates:
+                return max(candidates), end + size - 1
+        return None
+
+    def _scan(self, words):
+        """Segments shorter than an anchor: look for the whole run of normalized words"""
+        words = [word for word in (normalize_word(word) for word in words) if word]
+        size = len(words)
+        if not size:
+            return None
+        for i in range(len(self.normalized) - size + 1):
+            if self.normalized[i:i + size] == words:
+                return i, i + size - 1
+        return None
@@ -56,12 +56,12 @@ class Worker:
         self.s3 = boto3.client('s3',
             aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
             aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.environ.get('AWS_REGION')
+            region_name=os.environ.get('AWS_REGION'),
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL')
         )
         
         self.sqs_queue_url = os.environ.get('SQS_QUEUE_URL')
         self.s3_bucket = os.environ.get('S3_BUCKET_NAME')
-        self.video_processor = VideoProcessor()
         self.running = True
         
         # Initialize thread pool with max workers
@@ -94,6 +94,12 @@ class Worker:
             os.makedirs(self.ytdl_cache_dir, exist_ok=True)
             logger.info(f"Using fallback cache directory: {self.ytdl_cache_dir}")
 
+        # Downloaded sources and transcripts are cached in the shared cache directory for other jobs and workers
+        self.video_processor = VideoProcessor(
+            source_cache_dir=self.ytdl_cache_dir,
+            transcript_cache_dir=self.ytdl_cache_dir
+        )
+
     def handle_shutdown(self, signum, frame):
         logger.info("Received shutdown signal. Cleaning up...")
         self.running = False
@@ -154,7 +160,8 @@ class Worker:
                 s3_client=self.s3,
                 s3_bucket=self.s3_bucket,
                 project_type=project_type,
-                clips=data.get('clips')  # Will be None for auto projects
+                clips=data.get('clips'),  # Will be None for auto projects
+                encoding_profile=data.get('encoding_profile')  # Defaults to the video quality's profile
             )
             
             try: